@@ -1,30 +1,232 @@
 import datetime as dt
-import os
-from pathlib import Path
+import functools as ft
+import json
+import logging
+import math
+import random
+import time
+from operator import itemgetter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+import numpy as np
 import pandas as pd
 import requests
-from dotenv import load_dotenv
 from forex_python.converter import CurrencyRates
+from requests.adapters import HTTPAdapter
 
+import http_cache
+import metrics
+import single_flight
+from constants import ASSETS_PAGE_SIZE, FNG_DTYPES, RANKING_UNIVERSE_SIZE
 
-env_file = Path(__file__).resolve().parent / '.env'
-load_dotenv(env_file)
-POLYGON_API_KEY = os.environ.get('POLYGON_API_KEY')
+try:
+    import orjson
+except ImportError: # The standard library decoder is used instead
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUTS = {
+    'assets': (3.05, 10),
+    'history': (3.05, 30),
+    'fng': (3.05, 10),
+    'fx_history': (3.05, 30),
+}
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5 # In seconds
+BACKOFF_MAX = 8 # In seconds
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Spacing of the CoinCap history points per interval, in miliseconds
+HISTORY_INTERVALS = {
+    'm1': 60 * 1000,
+    'm5': 5 * 60 * 1000,
+    'm15': 15 * 60 * 1000,
+    'm30': 30 * 60 * 1000,
+    'h1': 60 * 60 * 1000,
+    'h2': 2 * 60 * 60 * 1000,
+    'h6': 6 * 60 * 60 * 1000,
+    'h12': 12 * 60 * 60 * 1000,
+    'd1': 24 * 60 * 60 * 1000,
+}
+FETCH_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
+# One session for all fetchers, so connections to the same host are kept
+# alive and reused instead of reopened on every call
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+def decode_json(content):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def get_json(url, endpoint):
+    labels = {'endpoint': endpoint}
+    cache_key = normalize_url(url)
+    entry = http_cache.read_entry(cache_key) if http_cache.is_enabled() else None
+    if entry is not None and http_cache.is_fresh(entry, endpoint):
+        metrics.increment('upstream_cache_requests_total', dict(labels, result='hit'))
+        return decode_json(http_cache.get_content(entry))
+    headers = http_cache.get_validators(entry)
+    for attempt in range(MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = SESSION.get(
+                url, headers=headers, timeout=REQUEST_TIMEOUTS[endpoint]
+            )
+            metrics.increment(
+                'upstream_requests_total', dict(labels, status=response.status_code)
+            )
+            metrics.observe('upstream_response_bytes', labels, len(response.content))
+            response.raise_for_status()
+            if response.status_code == 304 and entry is not None:
+                # Unchanged upstream, the cached payload is kept for another TTL
+                http_cache.write_entry(cache_key, response, payload=entry['payload'])
+                metrics.increment(
+                    'upstream_cache_requests_total', dict(labels, result='revalidated')
+                )
+                return decode_json(http_cache.get_content(entry))
+            content = decode_json(response.content)
+            if http_cache.is_enabled():
+                http_cache.write_entry(cache_key, response)
+                metrics.increment(
+                    'upstream_cache_requests_total', dict(labels, result='miss')
+                )
+            return content
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as error:
+            if not isinstance(error, requests.HTTPError):
+                metrics.increment(
+                    'upstream_requests_total', dict(labels, status=type(error).__name__)
+                )
+            is_retryable = (
+                not isinstance(error, requests.HTTPError) or
+                error.response.status_code in RETRY_STATUS_CODES
+            )
+            if not is_retryable or attempt == MAX_RETRIES:
+                raise
+        finally:
+            metrics.observe(
+                'upstream_request_duration_seconds', labels, time.perf_counter() - start
+            )
+        metrics.increment('upstream_retries_total', labels)
+        # Exponential backoff with full jitter
+        time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+
+def normalize_url(url):
+    # Query parameters are sorted, so the same request always gets the same
+    # key whatever order its parameters were written in
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, '')
+    )
+
+
+def coalesce(endpoint, build_url):
+    # Concurrent calls for the same normalized request wait for one fetch
+    # and share its parsed frame, which callers must not modify in place
+    def decorator(fetcher):
+        @ft.wraps(fetcher)
+        def wrapper(*args, **kwargs):
+            key = normalize_url(build_url(*args, **kwargs))
+            df, is_shared = single_flight.run(key, lambda: fetcher(*args, **kwargs))
+            if is_shared:
+                metrics.increment('upstream_coalesced_total', {'endpoint': endpoint})
+            return df
+        return wrapper
+    return decorator
+
+
+def record_fetch_error(endpoint, error):
+    # Fetchers fall back to an empty frame on errors, so they are logged and
+    # counted here instead of disappearing
+    logger.warning('Fetching %s failed: %r', endpoint, error)
+    metrics.increment(
+        'upstream_fetch_errors_total',
+        {'endpoint': endpoint, 'error': type(error).__name__}
+    )
 
 
 def get_exchange_rates():
-    rates = CurrencyRates().get_rates(base_cur='USD')
+    # forex-python makes its own request, so it is timed around the call
+    labels = {'endpoint': 'exchange_rates'}
+    start = time.perf_counter()
+    try:
+        rates = CurrencyRates().get_rates(base_cur='USD')
+    except Exception as error:
+        metrics.increment(
+            'upstream_requests_total', dict(labels, status=type(error).__name__)
+        )
+        raise
+    finally:
+        metrics.observe(
+            'upstream_request_duration_seconds', labels, time.perf_counter() - start
+        )
+    metrics.increment('upstream_requests_total', dict(labels, status=200))
     df = pd.DataFrame([rates]).assign(USD=1.0)
     return df
 
 
-def get_assets():
-    url = 'http://api.coincap.io/v2/assets?limit=10'
+def get_exchange_rate_history_url(start, end, currencies):
+    foreign_currencies = [currency for currency in currencies if currency != 'USD']
+    url = (
+        f'https://api.frankfurter.app/{start.isoformat()}..{end.isoformat()}' +
+        f'?from=USD&to={",".join(foreign_currencies)}'
+    )
+    return url
+
+
+@coalesce('fx_history', get_exchange_rate_history_url)
+def get_exchange_rate_history(start, end, currencies):
+    # Daily ECB reference rates, published on business days only
+    foreign_currencies = [currency for currency in currencies if currency != 'USD']
+    url = get_exchange_rate_history_url(start, end, currencies)
     try:
-        response = requests.get(url)
-        response_data = response.json()['data']
-    except:
+        response_data = get_json(url, 'fx_history')['rates']
+    except FETCH_ERRORS as error:
+        record_fetch_error('fx_history', error)
+        response_data = {}
+    df = (
+        pd
+        .DataFrame
+        .from_dict(response_data, orient='index', columns=foreign_currencies)
+        .astype('float64')
+        .assign(USD=1.0)
+        .rename_axis('date')
+        .reset_index()
+    )
+    return df
+
+
+def get_assets_url(limit=RANKING_UNIVERSE_SIZE, page_size=ASSETS_PAGE_SIZE):
+    # The ranking spans several pages, so it is keyed by its total size
+    return f'http://api.coincap.io/v2/assets?limit={limit}&page_size={page_size}'
+
+
+@coalesce('assets', get_assets_url)
+def get_assets(limit=RANKING_UNIVERSE_SIZE, page_size=ASSETS_PAGE_SIZE):
+    # The ranking is fetched in pages of at most `page_size` assets; a failed
+    # page drops the whole result, so the previous complete ranking is kept
+    response_data = []
+    for offset in range(0, limit, page_size):
+        count = min(page_size, limit - offset)
+        url = f'http://api.coincap.io/v2/assets?limit={count}&offset={offset}'
+        try:
+            page = get_json(url, 'assets')['data']
+        except FETCH_ERRORS as error:
+            record_fetch_error('assets', error)
+            response_data = []
+            break
+        response_data.extend(page)
+        if len(page) < count:
+            break
+    if not response_data:
         response_data = {
             'id': [], 'rank': [], 'symbol': [], 'name': [], 'supply': [],
             'maxSupply': [], 'marketCapUsd': [], 'volumeUsd24Hr': [], 'priceUsd': [],
@@ -47,34 +249,62 @@ def get_assets():
     return df
 
 
-def get_asset_history(start, end, currency, interval='d1'):
+def get_asset_history_url(start, end, currency, interval='d1'):
+    # History points fall on multiples of the interval, so the bounds are
+    # moved to the first point from the start on and to just before the point
+    # following the end; callers asking for data "until now" then send the
+    # same request until a new point is due
+    step = HISTORY_INTERVALS.get(interval, 1)
     unix_start = start.replace(tzinfo=dt.timezone.utc).timestamp() * 1000 # In miliseconds
     unix_end = end.replace(tzinfo=dt.timezone.utc).timestamp() * 1000 # In miliseconds
+    unix_start = math.ceil(unix_start / step) * step
+    unix_end = (math.floor(unix_end / step) + 1) * step - 1
     url = (
         f"http://api.coincap.io/v2/assets/{currency}/history?" + 
         f"interval={interval}&start={unix_start}&end={unix_end}"
     )
+    return url
+
+
+@coalesce('history', get_asset_history_url)
+def get_asset_history(start, end, currency, interval='d1'):
+    url = get_asset_history_url(start, end, currency, interval)
     try:
-        response = requests.get(url)
-        response_data = response.json()['data']
-    except:
-        response_data = {'priceUsd': [], 'time': []}
-    df_cleaned = (
-        pd
-        .DataFrame(response_data)
-        .loc[:, ['priceUsd', 'time']]
-        .astype({'priceUsd': 'float64', 'time': 'datetime64[ms]'})
-        .rename(columns={'time': 'timestamp'})
-    )
+        response_data = get_json(url, 'history')['data']
+        # Columns are converted straight from the decoded points, without an
+        # intermediate frame of strings
+        prices = np.fromiter(
+            map(float, map(itemgetter('priceUsd'), response_data)),
+            dtype='float64',
+            count=len(response_data)
+        )
+        times = np.fromiter(
+            map(itemgetter('time'), response_data),
+            dtype='int64',
+            count=len(response_data)
+        )
+    except FETCH_ERRORS as error:
+        record_fetch_error('history', error)
+        prices = np.array([], dtype='float64')
+        times = np.array([], dtype='int64')
+    df_cleaned = pd.DataFrame({
+        'priceUsd': prices,
+        'timestamp': times.astype('datetime64[ms]'),
+    })
     return df_cleaned
 
 
+def get_fear_greed_data_url():
+    return 'https://api.alternative.me/fng/?limit=365&date_format=us'
+
+
+@coalesce('fng', get_fear_greed_data_url)
 def get_fear_greed_data():
-    url = 'https://api.alternative.me/fng/?limit=365&date_format=us'
+    url = get_fear_greed_data_url()
     try:
-        response = requests.get(url)
-        response_data = response.json()['data']
-    except:
+        response_data = get_json(url, 'fng')['data']
+    except FETCH_ERRORS as error:
+        record_fetch_error('fng', error)
         response_data = {
             'value': [],
             'value_classification': [],
@@ -84,41 +314,7 @@ def get_fear_greed_data():
     df_clean = (
         df
         .loc[:, ['value', 'value_classification', 'timestamp']]
-        .astype({'value': 'int64', 'timestamp': 'datetime64[ms]'})
+        .astype({**FNG_DTYPES, 'timestamp': 'datetime64[ms]'})
         .sort_values(by=['timestamp'], ascending=False)
     )
     return df_clean
-
-
-def get_rsi_data():
-    url = (
-        f'https://api.polygon.io/v1/indicators/rsi/X:BTCUSD' + 
-        f'?timespan=hour&window=14&series_type=close&expand_underlying=false' + 
-        f'&order=desc&limit=700&apiKey={POLYGON_API_KEY}'
-    )
-    try:
-        response = requests.get(url)
-        response_data = response.json()["results"]["values"]
-    except:
-        response_data = {'timestamp': [], 'value': []}
-    df = (
-        pd
-        .DataFrame(response_data)
-        .astype({'timestamp': 'datetime64[ms]'})
-    )
-    return df
-
-
-def get_ma_data(window, ma_type):
-    url = (
-        f'https://api.polygon.io/v1/indicators/{ma_type}/X:BTCUSD?' +
-        f'timespan=hour&window={window}&series_type=close&order=desc&limit=700' +
-        f'&apiKey={POLYGON_API_KEY}'
-    )
-    try:
-        response = requests.get(url)
-        response_data = response.json()["results"]["values"]
-    except:
-        response_data = {'timestamp': [], 'value': []}
-    df = pd.DataFrame(response_data).astype({'timestamp': 'datetime64[ms]'})
-    return df
@@ -1,75 +1,246 @@
 import datetime as dt
+import functools as ft
+import math
+import time
 from dateutil import parser
 
 import dash
 import dash_bootstrap_components as dbc
 import plotly.express as px
-from dash import Input, Output, State
-
-from api import get_assets, get_fear_greed_data, get_rsi_data
-from constants import CURRENCY_SYMBOLS, COLORS
+import plotly.graph_objects as go
+from dash import ClientsideFunction, Input, Output, Patch, State, ctx, no_update
+from dash.exceptions import PreventUpdate
+from flask import Response, g, jsonify, request
+
+from api import get_assets, get_fear_greed_data
+from constants import (
+    CURRENCY_SYMBOLS, COLORS, MAIN_GRAPH_ASSETS, MAIN_GRAPH_MAX_POINTS,
+    MAIN_GRAPH_MIN_POINTS, RANKING_PAGE_SIZE, REFRESH_INTERVALS
+)
 from layout.main_layout import render_layout
-from utils import clean_price_data, clean_ma_data, clean_exchange_rates
+from layout.tab_sections.fng import render_fng_table
+from metrics import increment, observe, render_metrics
+from scheduler import (
+    cache_by_version, register_dataset, get_dataset, get_snapshot, get_version,
+    get_status, is_ready, start_scheduler
+)
+from stream import (
+    get_cursor, get_quotes, get_quotes_since, start_stream,
+    update_quotes_from_assets
+)
+from utils import (
+    apply_live_quotes, build_price_levels, clean_price_data, clean_rsi_data,
+    clean_ma_data, clean_exchange_rates, clean_exchange_rate_history,
+    clean_ranking_data, convert_price_data, downsample_price_series,
+    load_indicator_prices, query_ranking_data, select_price_level,
+    slice_price_data
+)
 
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.config.suppress_callback_exceptions = True
+server = app.server
+
+
+def render_placeholder_figure(message='Data is still loading, please wait...'):
+    fig = go.Figure()
+    fig.add_annotation(
+        text=message,
+        showarrow=False,
+        font={'color': COLORS['text'], 'size': 16}
+    )
+    fig.layout.plot_bgcolor = COLORS['background']
+    fig.layout.paper_bgcolor = COLORS['background']
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False)
+    return fig
+
+
+def load_exchange_rates():
+    return clean_exchange_rates(
+        date=dt.date.today(), 
+        currency_names=list(CURRENCY_SYMBOLS.keys())
+    )
 
 
-DF_CRYPTO_ASSETS = get_assets()
-CRYPTO_ASSET_NAMES = DF_CRYPTO_ASSETS.loc[:, 'id'].to_list()
-FIAT_CURRENCY_RATES = clean_exchange_rates(
-    date=dt.date.today(), 
-    currency_names=['USD', 'EUR', 'GBP', 'PLN', 'CHF']
+register_dataset('assets', get_assets, REFRESH_INTERVALS['assets'])
+register_dataset(
+    'exchange_rates', load_exchange_rates, REFRESH_INTERVALS['exchange_rates']
 )
 
 ##### Main crypto graph section #####
-DF_MAIN_GRAPH = clean_price_data(
-    start=dt.datetime(2015, 1, 1),
-    end=dt.datetime.now(),
-    currencies=CRYPTO_ASSET_NAMES
-)
+def get_main_graph_assets():
+    # Only the top of the ranking has price history in the main graph
+    return (
+        get_dataset('assets')
+        .sort_values(by=['rank'])
+        .head(MAIN_GRAPH_ASSETS)
+        .loc[:, 'id']
+        .to_list()
+    )
 
 
-@app.callback(
-    Output("crypto-graph", "figure"),
-    [
-        Input("crypto-dropdown", "value"),
-        Input('base-currency', 'value'),
-        Input('start-date-picker', 'date'),
-        Input('end-date-picker', 'date')
-    ]
-)
-def display_main_crypto_series(crypto_dropdown, base_currency, start_date, end_date):
-    start_time = parser.isoparse(start_date)
-    end_time = parser.isoparse(end_date)
-    fiat_curr_rate = FIAT_CURRENCY_RATES[base_currency]
-    df = (
-        DF_MAIN_GRAPH
-        .loc[lambda x: x['timestamp'].between(start_time, end_time)]
-        .set_index('timestamp')
-        .multiply(fiat_curr_rate)
-        .reset_index()
-        .rename(columns={'timestamp': 'date'})
+def load_main_graph():
+    if not is_ready('assets'):
+        return None
+    return clean_price_data(
+        start=dt.datetime(2015, 1, 1),
+        end=dt.datetime.now(),
+        currencies=get_main_graph_assets()
     )
-    fig = px.line(
-        df,
-        x='date',
-        y=crypto_dropdown,
-        labels={
-            "bitcoin": "Price",
-            "value": "Price",
-            "date": "Date"
-        }
+
+
+def load_fx_history():
+    return clean_exchange_rate_history(
+        start=dt.date(2015, 1, 1),
+        end=dt.date.today(),
+        currency_names=list(CURRENCY_SYMBOLS.keys())
+    )
+
+
+register_dataset('main_graph', load_main_graph, REFRESH_INTERVALS['main_graph'])
+register_dataset('fx_history', load_fx_history, REFRESH_INTERVALS['fx_history'])
+
+
+# Historical prices are converted with the rate of their own date; the
+# converted matrix is cached per base currency and dataset snapshots
+@cache_by_version(maxsize=8)
+def get_converted_price_data(base_currency, main_graph, fx_history):
+    if base_currency == 'USD':
+        return main_graph.value
+    return convert_price_data(main_graph.value, fx_history.value, base_currency)
+
+
+# Daily, weekly and monthly closes are built once per main graph snapshot,
+# as row positions into its matrix shared by every base currency
+@cache_by_version(maxsize=2)
+def get_price_levels(main_graph):
+    return build_price_levels(main_graph.value.index)
+
+
+def get_price_level(start_time, end_time, main_graph):
+    # Wide ranges are drawn from a coarser level, so the number of points
+    # stays about the same however far back the range starts
+    if not MAIN_GRAPH_MIN_POINTS:
+        return None
+    return select_price_level(
+        get_price_levels(main_graph),
+        main_graph.value.index,
+        start_time,
+        end_time,
+        MAIN_GRAPH_MIN_POINTS
+    )
+
+
+# Traces are cached per asset, range, level, base currency and dataset
+# snapshots, so a selection change only builds the series that were added
+@cache_by_version(maxsize=256)
+def render_price_trace(asset, start_time, end_time, level, base_currency,
+                       main_graph, fx_history):
+    df_main_graph = get_converted_price_data(base_currency, main_graph, fx_history)
+    level_rows = (
+        None if level is None else get_price_levels(main_graph)[level]
+    )
+    series = slice_price_data(
+        df_main_graph, start_time, end_time, asset, level_rows
+    )
+    if MAIN_GRAPH_MAX_POINTS and len(series) > MAIN_GRAPH_MAX_POINTS:
+        series = downsample_price_series(series, MAIN_GRAPH_MAX_POINTS)
+    trace = go.Scatter(x=series.index, y=series.values, name=asset, mode='lines')
+    return trace.to_plotly_json()
+
+
+@ft.lru_cache(maxsize=1)
+def render_price_layout():
+    fig = go.Figure()
+    fig.update_layout(
+        xaxis_title='Date',
+        yaxis_title='Price',
+        legend_title_text='variable',
+        showlegend=True
     )
     fig.layout.plot_bgcolor = COLORS['background']
     fig.layout.paper_bgcolor = COLORS['background']
     fig.update_xaxes(showgrid=False, zeroline=False)
     fig.update_yaxes(showgrid=False, zeroline=False)
-    return fig
+    return fig.to_plotly_json()['layout']
 
 
 @app.callback(
+    [
+        Output("crypto-graph", "figure"),
+        Output("crypto-graph-traces", "data")
+    ],
+    [
+        Input("crypto-dropdown", "value"),
+        Input('base-currency', 'value'),
+        Input('start-date-picker', 'date'),
+        Input('end-date-picker', 'date'),
+        Input('ready-datasets', 'data')
+    ],
+    [State("crypto-graph-traces", "data")]
+)
+def display_main_crypto_series(crypto_dropdown, base_currency, start_date,
+                               end_date, ready_datasets, drawn_traces):
+    # `ready_datasets` only triggers a redraw of a placeholder once the
+    # prices have loaded; a drawn figure gets an empty patch
+    # Snapshots are read once, so every trace of the figure is built from
+    # the same data even if a refresh lands meanwhile
+    main_graph = get_snapshot('main_graph')
+    fx_history = get_snapshot('fx_history')
+    if main_graph.version == 0:
+        return render_placeholder_figure(), None
+    if base_currency != 'USD' and fx_history.version == 0:
+        return render_placeholder_figure(), None
+    start_time = parser.isoparse(start_date)
+    end_time = parser.isoparse(end_date)
+    snapshots = (main_graph, fx_history)
+    versions = (main_graph.version, fx_history.version)
+    df_main_graph = get_converted_price_data(base_currency, *snapshots)
+    if crypto_dropdown is None:
+        crypto_dropdown = []
+    if isinstance(crypto_dropdown, str):
+        crypto_dropdown = [crypto_dropdown]
+    # Coins that dropped out of the ranking since the page was loaded are skipped
+    selected_cryptos = [
+        crypto for crypto in crypto_dropdown if crypto in df_main_graph.columns
+    ]
+    level = get_price_level(start_time, end_time, main_graph)
+    figure_key = [base_currency, start_date, end_date, *versions]
+    if drawn_traces is None or drawn_traces['key'] != figure_key:
+        figure = {
+            'data': [
+                render_price_trace(
+                    crypto, start_time, end_time, level, base_currency, *snapshots
+                )
+                for crypto in selected_cryptos
+            ],
+            'layout': render_price_layout()
+        }
+        return figure, {'key': figure_key, 'names': selected_cryptos}
+    # Only the selection changed: removed traces are deleted from the back,
+    # so earlier indexes stay valid, and new ones are appended
+    figure_patch = Patch()
+    for index in reversed(range(len(drawn_traces['names']))):
+        if drawn_traces['names'][index] not in selected_cryptos:
+            del figure_patch['data'][index]
+    trace_names = [
+        name for name in drawn_traces['names'] if name in selected_cryptos
+    ]
+    for crypto in selected_cryptos:
+        if crypto not in trace_names:
+            figure_patch['data'].append(
+                render_price_trace(
+                    crypto, start_time, end_time, level, base_currency, *snapshots
+                )
+            )
+            trace_names.append(crypto)
+    return figure_patch, {'key': figure_key, 'names': trace_names}
+
+
+##### Ranking section #####
+app.clientside_callback(
+    ClientsideFunction(namespace='currency', function_name='display_exchange_rates'),
     [
         Output('LED-display-usd', 'value'),
         Output('LED-display-pln', 'value'),
@@ -80,121 +251,124 @@ def display_main_crypto_series(crypto_dropdown, base_currency, start_date, end_d
         Output('alert', 'color'),
         Output('alert', 'is_open')
     ],
-    [Input('base-currency', 'value')]
+    [
+        Input('base-currency', 'value'),
+        Input('fiat-rates-store', 'data')
+    ]
 )
-def display_exchange_rates(base_currency):
-    fiat_curr_rate = FIAT_CURRENCY_RATES[base_currency]
-    updated_rates = {
-        label: round((value / fiat_curr_rate), 2) 
-        for label, value in FIAT_CURRENCY_RATES.items()
-    }
-    usd_rate = updated_rates['USD']
-    pln_rate = updated_rates['PLN']
-    eur_rate = updated_rates['EUR']
-    gbp_rate = updated_rates['GBP']
-    chf_rate = updated_rates['CHF']
-    alert_message = "Everything ok"
-    color = "info"
-    is_open = False
-    return usd_rate, pln_rate, eur_rate, gbp_rate, chf_rate, alert_message, color, is_open
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='currency', function_name='display_ranking_table_header'),
     Output('table-header', 'children'),
     [Input('base-currency', 'value')]
 )
-def display_ranking_table_header(base_currency):
-    return f'Ranking of 10 ten most popular cryptocurrencies in {base_currency}:'
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='currency', function_name='display_ranking_table_body'),
     [
         Output('crypto-table', 'columns'),
         Output('crypto-table', 'data')
     ],
-    [Input('base-currency', 'value')]
+    [
+        Input('base-currency', 'value'),
+        Input('crypto-table-usd', 'data'),
+        Input('fiat-rates-store', 'data')
+    ]
 )
-def display_ranking_table_body(base_currency):
-    curr_symbol = CURRENCY_SYMBOLS[base_currency]
-    fiat_curr_rate = FIAT_CURRENCY_RATES[base_currency]
-    df_cleaned = (
-        DF_CRYPTO_ASSETS
-        .assign(
-            priceUsd=lambda x: x['priceUsd'] * fiat_curr_rate,
-            marketCapUsd=lambda x: x['marketCapUsd'] * fiat_curr_rate,
-            Logo=lambda x: (
-                '[![Coin](https://cryptologos.cc/logos/' +
-                x["id"] + "-" + x["symbol"].str.lower() +
-                '-logo.svg?v=023#thumbnail)](https://cryptologos.cc/)'
-            ),
-        )
-        .round({
-            'priceUsd': 4,
-            'supply': 2,
-            'marketCapUsd': 2,
-            'changePercent24Hr': 2,
-        })
-        .rename(columns={
-            'rank': 'Pos',
-            'name': 'Crypto Name',
-            'symbol': 'Symbol',
-            'priceUsd': f'Price[{curr_symbol}]',
-            'marketCapUsd': f'MarketCap[{curr_symbol}]',
-            'supply': 'Supply',
-            'changePercent24Hr': "Change24h[%]",
-        })
-        .reindex(columns=[
-            'Pos', 'Logo', 'Crypto Name', 'Symbol',
-            f'Price[{curr_symbol}]', 'Supply',
-            f'MarketCap[{curr_symbol}]', 'Change24h[%]'
-        ])
-    )
-    data = df_cleaned.to_dict('records')
-    columns = []
-    for col_name in df_cleaned.columns.to_list():
-        if col_name == 'Logo':
-            columns.append({
-                'id': col_name, 
-                'name': col_name,
-                'presentation': 'markdown',
-            })
-        else:
-            columns.append({
-                'id': col_name, 
-                'name': col_name,
-            })
-    return (columns, data)
 
 
-##### Fear and greed index section #####
-df_fng = get_fear_greed_data()
+@ft.lru_cache(maxsize=2)
+def get_ranking_data(assets_version):
+    return clean_ranking_data(get_dataset('assets'))
 
+
+def render_ranking_page(page_current, page_size, sort_by, filter_query):
+    # The cursor is read first, so quotes that arrive while the page is
+    # built are sent again with the next patch
+    cursor = get_cursor()
+    df_ranking = apply_live_quotes(
+        get_ranking_data(get_version('assets')), get_quotes()
+    )
+    df_page, row_count = query_ranking_data(
+        df_ranking,
+        filter_query,
+        sort_by,
+        page_current or 0,
+        page_size,
+        get_dataset('exchange_rates')
+    )
+    live_state = {'ids': df_page.index.to_list(), 'cursor': cursor}
+    page_count = max(1, math.ceil(row_count / page_size))
+    return df_page.to_dict('records'), live_state, page_count
+
+
+def render_ranking_patch(live_state):
+    # Only the prices that changed since the browser's cursor are sent, as a
+    # patch of the rows on the visible page
+    quotes, cursor = get_quotes_since(live_state['cursor'])
+    if not any(asset in quotes for asset in live_state['ids']):
+        raise PreventUpdate
+    df_ranking = get_ranking_data(get_version('assets'))
+    table_patch = Patch()
+    for row, asset in enumerate(live_state['ids']):
+        if asset in quotes and asset in df_ranking.index:
+            table_patch[row]['priceUsd'] = quotes[asset]
+            table_patch[row]['marketCapUsd'] = (
+                quotes[asset] * df_ranking.at[asset, 'Supply']
+            )
+    state_patch = Patch()
+    state_patch['cursor'] = cursor
+    return table_patch, state_patch
+
+
+# Paging, sorting and filtering run on the server and only the visible page
+# is sent, as USD records that the clientside callback above converts
 @app.callback(
-    Output("fng-collapse", "is_open"),
-    [Input("fng-collapse-button", "n_clicks")],
-    [State("fng-collapse", "is_open")],
+    [
+        Output('crypto-table-usd', 'data'),
+        Output('ranking-live-state', 'data'),
+        Output('crypto-table', 'page_count')
+    ],
+    [
+        Input('crypto-table', 'page_current'),
+        Input('crypto-table', 'page_size'),
+        Input('crypto-table', 'sort_by'),
+        Input('crypto-table', 'filter_query'),
+        Input('ranking-live-interval', 'n_intervals')
+    ],
+    [State('ranking-live-state', 'data')]
 )
-def fng_toggle_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
+def display_ranking_page(page_current, page_size, sort_by, filter_query,
+                         n_intervals, live_state):
+    if not is_ready('assets'):
+        raise PreventUpdate
+    update_quotes_from_assets(get_dataset('assets'), get_version('assets'))
+    # Timer ticks patch the page in place; a page that never loaded, or that
+    # has no cursor, is requested again by the next tick
+    is_tick = set(ctx.triggered_prop_ids) == {'ranking-live-interval.n_intervals'}
+    if is_tick and live_state and 'cursor' in live_state:
+        table_patch, state_patch = render_ranking_patch(live_state)
+        return table_patch, state_patch, no_update
+    return render_ranking_page(
+        page_current, page_size or RANKING_PAGE_SIZE, sort_by, filter_query
+    )
 
 
-@app.callback(
-    Output("fng-line-graph", "figure"),
-    Input("fng-checklist", "value")
-)
-def display_fng_series(time_range):
-    if time_range == "Last Week":
-        df_cut = df_fng[:6]
-    elif time_range == "Last Month":
-        df_cut = df_fng[:29]
-    elif time_range == "Last Six Month":
-        df_cut = df_fng[:179]
-    else:
-        df_cut = df_fng
+##### Fear and greed index section #####
+register_dataset('fng', get_fear_greed_data, REFRESH_INTERVALS['fng'])
+
+
+# Indicator figures are built once per dataset version and shipped to the
+# browser in full; time ranges, MA types and collapses are handled by
+# clientside callbacks
+@ft.lru_cache(maxsize=2)
+def render_fng_figure(version):
+    if not is_ready('fng'):
+        return render_placeholder_figure()
     fig = px.line(
-        df_cut,
+        get_dataset('fng'),
         x='timestamp',
         y='value',
         labels={
@@ -209,25 +383,38 @@ def display_fng_series(time_range):
     return fig
 
 
-###### RSI indicator section #######
-df_rsi = get_rsi_data()
+app.clientside_callback(
+    ClientsideFunction(namespace='indicators', function_name='toggle_collapse'),
+    Output("fng-collapse", "is_open"),
+    [Input("fng-collapse-button", "n_clicks")],
+    [State("fng-collapse", "is_open")],
+)
 
 
-@app.callback(
-    Output("rsi-line-graph", "figure"),
-    Input("rsi-checklist", "value")
+app.clientside_callback(
+    ClientsideFunction(namespace='indicators', function_name='display_fng_series'),
+    Output("fng-line-graph", "figure"),
+    [
+        Input("fng-checklist", "value"),
+        Input("fng-figure-store", "data")
+    ]
 )
-def display_rsi_series(time_range):
-    if time_range == "Last Day":
-        df_cut = df_rsi[:25]
-    elif time_range == "Last Week":
-        df_cut = df_rsi[:169]
-    elif time_range == "Last Two Weeks":
-        df_cut = df_rsi[:337]
-    else:
-        df_cut = df_rsi
+
+
+###### RSI indicator section #######
+def load_rsi_data():
+    return clean_rsi_data(load_indicator_prices(), window=14)
+
+
+register_dataset('rsi', load_rsi_data, REFRESH_INTERVALS['rsi'])
+
+
+@ft.lru_cache(maxsize=2)
+def render_rsi_figure(version):
+    if not is_ready('rsi'):
+        return render_placeholder_figure()
     fig = px.scatter(
-        df_cut,
+        get_dataset('rsi'),
         x="timestamp",
         y="value",
         color="value",
@@ -246,80 +433,175 @@ def display_rsi_series(time_range):
     return fig
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='indicators', function_name='display_rsi_series'),
+    Output("rsi-line-graph", "figure"),
+    [
+        Input("rsi-checklist", "value"),
+        Input("rsi-figure-store", "data")
+    ]
+)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='indicators', function_name='toggle_collapse'),
     Output("rsi-collapse", "is_open"),
     [Input("rsi-collapse-button", "n_clicks")],
     [State("rsi-collapse", "is_open")],
 )
-def rsi_toggle_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
 
 
 ###### MA-50 and Ma-200 indicator section #######
-df_ma50, df_ma200 = clean_ma_data(
-    ma_windows=['50', '180'], 
-    ma_types=['sma', 'ema']
-)
+def load_ma_data():
+    return clean_ma_data(load_indicator_prices(), ma_windows=[50, 180])
+
+
+register_dataset('ma', load_ma_data, REFRESH_INTERVALS['ma'])
+
+
+@ft.lru_cache(maxsize=2)
+def render_ma_figures(version):
+    if not is_ready('ma'):
+        placeholder = render_placeholder_figure()
+        return {'50 days': placeholder, '200 days': placeholder}
+    figures = {}
+    for window, df_ma in zip(['50 days', '200 days'], get_dataset('ma')):
+        fig = px.line(
+            df_ma,
+            x='timestamp',
+            y=['SMA', 'EMA', 'BTC price'],
+            title="Moving Averages Index for X:BTC-USD indicator",
+            labels={
+                "value": "BTC Price",
+                "timestamp": "Date"
+            }
+        )
+        fig.layout.plot_bgcolor = COLORS['background']
+        fig.layout.paper_bgcolor = COLORS['background']
+        fig.update_xaxes(showgrid=False, zeroline=False)
+        fig.update_yaxes(showgrid=False, zeroline=False)
+        figures[window] = fig
+    return figures
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='indicators', function_name='display_ma_series'),
     Output('ma-line-graph', 'figure'),
     [
         Input('ma-types', 'value'),
         Input('ma-window', 'value'),
-        Input('ma-period', 'value')
+        Input('ma-period', 'value'),
+        Input('ma-figure-store', 'data')
     ]
 )
-def display_ma_series(types, window, period):
-    if window == "50 days":
-        df_ma = df_ma50
-    else:
-        df_ma = df_ma200
-    if period == "Last Day":
-        df_ma_cut = df_ma[:25]
-    elif period == "Last Week":
-        df_ma_cut = df_ma[:169]
-    elif period == "Last Two Weeks":
-        df_ma_cut = df_ma[:337]
-    else:
-        df_ma_cut = df_ma
-    ma_types = []
-    if "  Simple Moving Average (SMA)" in types:
-        ma_types.append('SMA')
-    if "  Exponential Moving Average (EMA)" in types:
-        ma_types.append('EMA')
-    ma_types.append('BTC price')
-    fig = px.line(
-        df_ma_cut,
-        x='timestamp',
-        y=ma_types,
-        title="Moving Averages Index for X:BTC-USD indicator",
-        labels={
-            "value": "BTC Price",
-            "timestamp": "Date"
-        }
-    )
-    fig.layout.plot_bgcolor = COLORS['background']
-    fig.layout.paper_bgcolor = COLORS['background']
-    fig.update_xaxes(showgrid=False, zeroline=False)
-    fig.update_yaxes(showgrid=False, zeroline=False)
-    return fig
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='indicators', function_name='toggle_collapse'),
     Output("ma-collapse", "is_open"),
     [Input("ma-collapse-button", "n_clicks")],
     [State("ma-collapse", "is_open")],
 )
-def ma_toggle_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
 
 
-app.layout = render_layout(CRYPTO_ASSET_NAMES, df_fng)
-server = app.server
+def serve_layout():
+    # Rendered on every page load, so new visitors get the latest snapshots
+    if is_ready('assets'):
+        asset_names = get_main_graph_assets()
+    else:
+        asset_names = []
+    indicator_figures = {
+        'fng': render_fng_figure(get_version('fng')),
+        'rsi': render_rsi_figure(get_version('rsi')),
+        'ma': render_ma_figures(get_version('ma')),
+    }
+    status = get_status()
+    ready_datasets = sorted(name for name, s in status.items() if s['ready'])
+    return render_layout(
+        asset_names,
+        get_dataset('fng'),
+        get_dataset('exchange_rates'),
+        indicator_figures,
+        ready_datasets,
+        is_loading=len(ready_datasets) < len(status)
+    )
+
+
+# Pages rendered while datasets were loading poll until every one is ready;
+# each section built from a placeholder is sent again once its data arrives
+@app.callback(
+    [
+        Output('ready-datasets', 'data'),
+        Output('readiness-interval', 'disabled'),
+        Output('crypto-dropdown', 'options'),
+        Output('fiat-rates-store', 'data'),
+        Output('fng-table-container', 'children'),
+        Output('fng-figure-store', 'data'),
+        Output('rsi-figure-store', 'data'),
+        Output('ma-figure-store', 'data')
+    ],
+    [Input('readiness-interval', 'n_intervals')],
+    [State('ready-datasets', 'data')]
+)
+def refresh_loading_sections(n_intervals, ready_datasets):
+    status = get_status()
+    now_ready = sorted(name for name, s in status.items() if s['ready'])
+    loaded = set(now_ready) - set(ready_datasets or [])
+    if not loaded:
+        raise PreventUpdate
+
+    def render_if_loaded(name, render):
+        return render() if name in loaded else no_update
+
+    return (
+        now_ready,
+        len(now_ready) == len(status),
+        render_if_loaded('assets', get_main_graph_assets),
+        render_if_loaded('exchange_rates', lambda: {
+            'rates': get_dataset('exchange_rates'), 'symbols': CURRENCY_SYMBOLS
+        }),
+        render_if_loaded('fng', lambda: render_fng_table(get_dataset('fng'))),
+        render_if_loaded('fng', lambda: render_fng_figure(get_version('fng'))),
+        render_if_loaded('rsi', lambda: render_rsi_figure(get_version('rsi'))),
+        render_if_loaded('ma', lambda: render_ma_figures(get_version('ma'))),
+    )
+
+
+@server.route('/ready')
+def ready():
+    status = get_status()
+    status_code = 200 if all(s['ready'] for s in status.values()) else 503
+    return jsonify(status), status_code
+
+
+# Callback requests are labelled by their outputs, as Dash identifies them
+@server.before_request
+def start_callback_timer():
+    if request.path.endswith('/_dash-update-component'):
+        g.callback_start = time.perf_counter()
+
+
+@server.after_request
+def record_callback_metrics(response):
+    if 'callback_start' not in g:
+        return response
+    payload = request.get_json(silent=True) or {}
+    labels = {'callback': payload.get('output', 'unknown')}
+    observe('dash_callback_duration_seconds', labels, time.perf_counter() - g.callback_start)
+    observe('dash_callback_response_bytes', labels, response.calculate_content_length() or 0)
+    increment('dash_callback_requests_total', dict(labels, status=response.status_code))
+    if response.status_code >= 500:
+        increment('dash_callback_errors_total', labels)
+    return response
+
+
+@server.route('/metrics')
+def serve_metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+start_scheduler()
+start_stream()
+app.layout = serve_layout
 if __name__ == '__main__':
     app.run_server()
@@ -0,0 +1,143 @@
+var TYPED_ARRAYS = {
+    i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+    i4: Int32Array, u4: Uint32Array, i8: BigInt64Array, u8: BigUint64Array,
+    f4: Float32Array, f8: Float64Array
+};
+
+
+function toArray(values) {
+    if (values === undefined || values === null) {
+        return [];
+    }
+    if (Array.isArray(values)) {
+        return values;
+    }
+    // Newer Plotly versions ship numeric arrays as base64 encoded typed arrays
+    var binary = atob(values.bdata);
+    var bytes = new Uint8Array(binary.length);
+    for (var i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return Array.from(new TYPED_ARRAYS[values.dtype](bytes.buffer), Number);
+}
+
+
+function scaleValue(value, rate, digits) {
+    if (value === null || value === undefined) {
+        return value;
+    }
+    var factor = Math.pow(10, digits);
+    return Math.round(value * rate * factor) / factor;
+}
+
+
+function sliceFigure(figure, size, traceNames) {
+    // Keeps the first `size` points of every trace, and only the traces
+    // listed in `traceNames` when it is given
+    var data = (figure.data || []).filter(function(trace) {
+        return !traceNames || traceNames.indexOf(trace.name) !== -1;
+    }).map(function(trace) {
+        var sliced = Object.assign({}, trace, {
+            x: toArray(trace.x).slice(0, size),
+            y: toArray(trace.y).slice(0, size)
+        });
+        if (trace.marker && trace.marker.color && typeof trace.marker.color !== 'string') {
+            sliced.marker = Object.assign({}, trace.marker, {
+                color: toArray(trace.marker.color).slice(0, size)
+            });
+        }
+        return sliced;
+    });
+    return Object.assign({}, figure, {data: data});
+}
+
+
+var NUMERIC_COLUMNS = ['Pos', 'Supply', 'Change24h[%]'];
+var FNG_RANGES = {'Last Week': 6, 'Last Month': 29, 'Last Six Month': 179};
+var HOURLY_RANGES = {'Last Day': 25, 'Last Week': 169, 'Last Two Weeks': 337};
+
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    currency: {
+        display_exchange_rates: function(baseCurrency, fiatRates) {
+            if (!fiatRates.rates) {
+                return [
+                    0, 0, 0, 0, 0,
+                    'Exchange rates are still loading, please wait a moment',
+                    'warning',
+                    true
+                ];
+            }
+            var rate = fiatRates.rates[baseCurrency];
+            var rates = ['USD', 'PLN', 'EUR', 'GBP', 'CHF'].map(function(label) {
+                return scaleValue(fiatRates.rates[label], 1 / rate, 2);
+            });
+            return rates.concat(['Everything ok', 'info', false]);
+        },
+
+        display_ranking_table_header: function(baseCurrency) {
+            return 'Ranking of the most popular cryptocurrencies in ' + baseCurrency + ':';
+        },
+
+        display_ranking_table_body: function(baseCurrency, records, fiatRates) {
+            if (!fiatRates.rates || !records) {
+                return [[], []];
+            }
+            var rate = fiatRates.rates[baseCurrency];
+            var symbol = fiatRates.symbols[baseCurrency];
+            var priceColumn = 'Price[' + symbol + ']';
+            var marketCapColumn = 'MarketCap[' + symbol + ']';
+            var columns = [
+                'Pos', 'Logo', 'Crypto Name', 'Symbol',
+                priceColumn, 'Supply', marketCapColumn, 'Change24h[%]'
+            ].map(function(name) {
+                if (name === 'Logo') {
+                    return {id: name, name: name, presentation: 'markdown'};
+                }
+                if (NUMERIC_COLUMNS.indexOf(name) !== -1 || name === priceColumn || name === marketCapColumn) {
+                    return {id: name, name: name, type: 'numeric'};
+                }
+                return {id: name, name: name};
+            });
+            var data = records.map(function(record) {
+                var row = Object.assign({}, record);
+                delete row.priceUsd;
+                delete row.marketCapUsd;
+                row[priceColumn] = scaleValue(record.priceUsd, rate, 4);
+                row[marketCapColumn] = scaleValue(record.marketCapUsd, rate, 2);
+                return row;
+            });
+            return [columns, data];
+        }
+    },
+
+    indicators: {
+        toggle_collapse: function(n, isOpen) {
+            if (n) {
+                return !isOpen;
+            }
+            return isOpen;
+        },
+
+        display_fng_series: function(timeRange, figure) {
+            return sliceFigure(figure, FNG_RANGES[timeRange]);
+        },
+
+        display_rsi_series: function(timeRange, figure) {
+            return sliceFigure(figure, HOURLY_RANGES[timeRange]);
+        },
+
+        display_ma_series: function(types, maWindow, period, figures) {
+            var figure = maWindow === '50 days' ? figures['50 days'] : figures['200 days'];
+            var maTypes = [];
+            if (types.indexOf('  Simple Moving Average (SMA)') !== -1) {
+                maTypes.push('SMA');
+            }
+            if (types.indexOf('  Exponential Moving Average (EMA)') !== -1) {
+                maTypes.push('EMA');
+            }
+            maTypes.push('BTC price');
+            return sliceFigure(figure, HOURLY_RANGES[period], maTypes);
+        }
+    }
+});
@@ -0,0 +1,181 @@
+import datetime as dt
+import functools as ft
+import json
+import re
+import zlib
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+
+
+# Number of assets the fake CoinCap universe holds, set per benchmark size
+UNIVERSE = {'assets': 10}
+# Directory of recorded responses, named after their fixture, that replace
+# the synthetic payloads of the same name
+RECORDED_DIR = {'path': None}
+INTERVAL_STEPS = {'d1': 24 * 60 * 60 * 1000, 'h1': 60 * 60 * 1000}
+FOREIGN_RATES = {'EUR': 0.92, 'GBP': 0.79, 'PLN': 4.05, 'CHF': 0.89}
+FNG_LABELS = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
+
+
+def get_asset_id(rank):
+    return 'bitcoin' if rank == 1 else f'coin-{rank}'
+
+
+def get_seed(*parts):
+    return zlib.crc32('/'.join(map(str, parts)).encode())
+
+
+def build_assets_payload(count):
+    rng = np.random.default_rng(get_seed('assets', count))
+    prices = np.sort(rng.lognormal(2, 3, count))[::-1]
+    supplies = rng.uniform(1e6, 1e10, count)
+    data = []
+    for rank in range(1, count + 1):
+        asset_id = get_asset_id(rank)
+        price, supply = prices[rank - 1], supplies[rank - 1]
+        data.append({
+            'id': asset_id,
+            'rank': str(rank),
+            'symbol': f'C{rank}',
+            'name': asset_id.title(),
+            'supply': f'{supply:.8f}',
+            'maxSupply': None if rank % 3 else f'{supply * 2:.8f}',
+            'marketCapUsd': f'{price * supply:.8f}',
+            'volumeUsd24Hr': f'{price * supply * 0.05:.8f}',
+            'priceUsd': f'{price:.16f}',
+            'changePercent24Hr': f'{rng.normal(0, 4):.16f}',
+            'vwap24Hr': f'{price * 1.001:.16f}',
+            'explorer': f'https://explorer.example/{asset_id}',
+        })
+    return {'data': data, 'timestamp': 0}
+
+
+def build_history_payload(asset_id, interval, start, end):
+    step = INTERVAL_STEPS[interval]
+    times = np.arange(-(-int(start) // step) * step, int(end), step)
+    # Prices are a function of time only, so overlapping requests agree on
+    # the points they share
+    phase = get_seed('history', asset_id) % 1000
+    days = times / INTERVAL_STEPS['d1']
+    prices = 100 * np.exp(
+        np.sin(days / 90 + phase) + 0.1 * np.sin(days * 7 + phase)
+    )
+    data = [
+        {
+            'priceUsd': f'{price:.16f}',
+            'time': int(time),
+            'date': (
+                dt.datetime
+                .fromtimestamp(time / 1000, dt.timezone.utc)
+                .strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            ),
+        }
+        for price, time in zip(prices, times)
+    ]
+    return {'data': data}
+
+
+def build_fng_payload(limit):
+    today = dt.date.today()
+    rng = np.random.default_rng(get_seed('fng', limit))
+    values = rng.integers(0, 100, limit)
+    data = [
+        {
+            'value': str(value),
+            'value_classification': FNG_LABELS[min(value // 20, 4)],
+            'timestamp': (today - dt.timedelta(days=day)).strftime('%m-%d-%Y'),
+        }
+        for day, value in enumerate(values)
+    ]
+    return {'name': 'Fear and Greed Index', 'data': data}
+
+
+def build_fx_history_payload(start, end, currencies):
+    dates = np.arange(
+        np.datetime64(start), np.datetime64(end) + 1, dtype='datetime64[D]'
+    )
+    dates = dates[np.is_busday(dates)]
+    rng = np.random.default_rng(get_seed('fx', start, end))
+    rates = {}
+    for date in dates:
+        rates[str(date)] = {
+            currency: round(FOREIGN_RATES[currency] * rng.uniform(0.95, 1.05), 5)
+            for currency in currencies
+        }
+    return {'amount': 1.0, 'base': 'USD', 'start_date': start, 'end_date': end,
+            'rates': rates}
+
+
+def build_latest_rates_payload():
+    return {'base': 'USD', 'rates': dict(FOREIGN_RATES)}
+
+
+def route_request(url, universe):
+    # Returns the fixture name of an upstream URL and a builder of the
+    # synthetic payload used when no recorded file exists for it
+    parts = urlsplit(url)
+    query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+    history = re.fullmatch(r'/v2/assets/([^/]+)/history', parts.path)
+    if parts.netloc == 'api.coincap.io' and history:
+        asset_id = history.group(1)
+        return f'history-{asset_id}-{query["interval"]}', lambda: build_history_payload(
+            asset_id, query['interval'], float(query['start']), float(query['end'])
+        )
+    if parts.netloc == 'api.coincap.io' and parts.path == '/v2/assets':
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', 100))
+        return 'assets', lambda: {
+            'data': build_assets_payload(universe)['data'][offset:offset + limit],
+            'timestamp': 0,
+        }
+    if parts.netloc == 'api.alternative.me':
+        return 'fng', lambda: build_fng_payload(int(query.get('limit', 1)))
+    if parts.netloc == 'api.frankfurter.app':
+        start, end = parts.path.strip('/').split('..')
+        return 'fx_history', lambda: build_fx_history_payload(
+            start, end, query['to'].split(',')
+        )
+    if parts.netloc == 'theratesapi.com':
+        return 'latest_rates', build_latest_rates_payload
+    return None, None
+
+
+@ft.lru_cache(maxsize=None)
+def render_payload(url, universe):
+    # Payloads are encoded once per URL, so timed runs only pay for the
+    # client side parsing, as they would with a recorded response
+    name, build_payload = route_request(url, universe)
+    if name is None:
+        return 404, b'{}'
+    if RECORDED_DIR['path'] is not None:
+        recorded_file = Path(RECORDED_DIR['path']) / f'{name}.json'
+        if recorded_file.exists():
+            return 200, recorded_file.read_bytes()
+    return 200, json.dumps(build_payload()).encode()
+
+
+def replay_send(adapter, request, **kwargs):
+    status_code, content = render_payload(request.url, UNIVERSE['assets'])
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers['Content-Type'] = 'application/json'
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    return response
+
+
+def install(recorded_dir=None):
+    # Every requests adapter answers from the fixtures, including the ones
+    # created by third party clients, so no benchmark touches the network
+    RECORDED_DIR['path'] = recorded_dir
+    HTTPAdapter.send = replay_send
+
+
+def set_universe(count):
+    UNIVERSE['assets'] = count
@@ -0,0 +1,482 @@
+import argparse
+import datetime as dt
+import gc
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from benchmarks import fixtures
+
+
+RANGES = {
+    'daily': {'interval': 'd1', 'start': dt.datetime(2015, 1, 1)},
+    'hourly': {'interval': 'h1', 'days': 90},
+}
+SELECTED_ASSETS = 5
+RANKING_PAGE_SIZE = 10
+RANGE_BENCHMARKS = [
+    'parse.get_asset_history',
+    'transform.clean_rsi_data',
+    'transform.clean_ma_data',
+    'transform.clean_price_data.cold',
+    'transform.clean_price_data.warm',
+    'transform.convert_price_data',
+    'transform.slice_price_data',
+    'transform.build_price_levels',
+    'callback.display_main_crypto_series',
+    'callback.display_main_crypto_series.patch',
+]
+CURRENCY_NAMES = ['USD', 'PLN', 'EUR', 'GBP', 'CHF']
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(
+        description=(
+            'Times the upstream parsers, data transforms and Dash callbacks '
+            'against replayed fixtures, without network access.'
+        )
+    )
+    arg_parser.add_argument('--assets', type=int, nargs='+', default=[10, 100, 1000])
+    arg_parser.add_argument('--ranges', nargs='+', choices=list(RANGES), default=list(RANGES))
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--only', help='Run only benchmarks whose name contains this text')
+    arg_parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory runs')
+    arg_parser.add_argument('--fixtures', help='Directory of recorded responses replacing the synthetic ones')
+    arg_parser.add_argument('--output', default='-', help='JSON results file, - for stdout')
+    arg_parser.add_argument('--compare', help='Baseline JSON results to check for regressions')
+    arg_parser.add_argument('--threshold', type=float, default=0.25)
+    return arg_parser.parse_args()
+
+
+def load_app(recorded_dir):
+    # The SQLite store is created in the working directory, so every run
+    # starts from an empty store in a temporary one
+    os.chdir(tempfile.mkdtemp(prefix='coinmarketcap-bench-'))
+    os.environ['LIVE_PRICES_URL'] = ''
+    os.environ.pop('SHARED_CACHE_DIR', None)
+    # Parsers are timed on fresh responses, not on cached payloads
+    os.environ['HTTP_CACHE_DIR'] = ''
+    fixtures.install(recorded_dir)
+    import scheduler
+    # Refresh loops stop right after the first load, the benchmarks then
+    # swap in the datasets of every size themselves
+    scheduler.STOP_EVENT.set()
+    import app
+    for thread in threading.enumerate():
+        if thread.name == 'refresh-scheduler':
+            thread.join()
+    return app
+
+
+def install_dataset(name, value):
+    import scheduler
+    previous = scheduler.SNAPSHOTS[name]
+    scheduler.SNAPSHOTS[name] = scheduler.Snapshot(
+        value, previous.version + 1, dt.datetime.now()
+    )
+
+
+def clear_price_store():
+    import models
+    with models.engine.begin() as connection:
+        connection.execute(models.PriceHistory.__table__.delete())
+
+
+def get_payload_size(value):
+    import plotly.io.json
+    return len(plotly.io.json.to_json_plotly(value))
+
+
+def measure(func, setup=None, repeat=5, warmup=True, memory=True):
+    # `setup` runs untimed before every call and returns its arguments
+    def call():
+        args = setup() if setup is not None else ()
+        gc.collect()
+        start = time.perf_counter()
+        result = func(*args)
+        return time.perf_counter() - start, result
+    if warmup:
+        call()
+    timings = []
+    for _ in range(repeat):
+        elapsed, result = call()
+        timings.append(elapsed)
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        call()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return timings, peak_memory, result
+
+
+class Suite:
+
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+
+    def wants(self, name):
+        return not self.args.only or self.args.only in name
+
+    def add(self, name, func, items=1, assets=None, range_name=None, setup=None,
+            repeat=None, warmup=True, payload=False):
+        if not self.wants(name):
+            return None
+        timings, peak_memory, result = measure(
+            func,
+            setup=setup,
+            repeat=repeat or self.args.repeat,
+            warmup=warmup,
+            memory=not self.args.no_memory
+        )
+        if callable(items):
+            items = items(result)
+        median = statistics.median(timings)
+        record = {
+            'name': name,
+            'assets': assets,
+            'range': range_name,
+            'items': items,
+            'runs': len(timings),
+            'median_s': median,
+            'min_s': min(timings),
+            'max_s': max(timings),
+            'items_per_s': items / median if median else None,
+            'peak_memory_bytes': peak_memory,
+            'payload_bytes': get_payload_size(result) if payload else None,
+        }
+        self.results.append(record)
+        print(format_record(record), file=sys.stderr)
+        return result
+
+
+def format_record(record):
+    memory = record['peak_memory_bytes']
+    return '{:<48} {:>6} {:>7} {:>10.2f} ms {:>14} items/s {:>10}'.format(
+        record['name'],
+        record['assets'] or '-',
+        record['range'] or '-',
+        record['median_s'] * 1000,
+        f"{record['items_per_s']:,.0f}" if record['items_per_s'] else '-',
+        f'{memory / 2 ** 20:.1f} MiB' if memory is not None else '-'
+    )
+
+
+def get_range_bounds(range_name, now):
+    spec = RANGES[range_name]
+    start = spec.get('start') or now - dt.timedelta(days=spec['days'])
+    return start, now, spec['interval']
+
+
+def run_static_benchmarks(suite, app):
+    import api
+    import utils
+    fixtures.set_universe(10)
+    df_fng = suite.add('parse.get_fear_greed_data', api.get_fear_greed_data, items=len)
+    today = dt.date.today()
+    suite.add(
+        'parse.get_exchange_rate_history',
+        lambda: api.get_exchange_rate_history(dt.date(2015, 1, 1), today, CURRENCY_NAMES),
+        items=len
+    )
+    if df_fng is None:
+        df_fng = api.get_fear_greed_data()
+    suite.add('transform.resample_df_fng', lambda: utils.resample_df_fng(df_fng), items=365)
+    for name, render_figure in [
+        ('callback.render_fng_figure', app.render_fng_figure),
+        ('callback.render_rsi_figure', app.render_rsi_figure),
+        ('callback.render_ma_figures', app.render_ma_figures),
+    ]:
+        suite.add(
+            name,
+            lambda render_figure=render_figure: render_figure(-1),
+            setup=lambda render_figure=render_figure: render_figure.cache_clear() or (),
+            payload=True
+        )
+
+
+def run_asset_benchmarks(suite, app, asset_count):
+    import api
+    import stream
+    import utils
+    fixtures.set_universe(asset_count)
+    df_assets = suite.add(
+        'parse.get_assets',
+        lambda: api.get_assets(limit=asset_count),
+        items=asset_count,
+        assets=asset_count
+    )
+    if df_assets is None:
+        df_assets = api.get_assets(limit=asset_count)
+    install_dataset('assets', df_assets)
+    suite.add(
+        'transform.clean_ranking_data',
+        lambda: utils.clean_ranking_data(df_assets),
+        items=asset_count,
+        assets=asset_count
+    )
+    suite.add(
+        'callback.serve_layout',
+        app.serve_layout,
+        items=asset_count,
+        assets=asset_count,
+        payload=True
+    )
+
+    suite.add(
+        'callback.render_ranking_page',
+        lambda: app.render_ranking_page(0, RANKING_PAGE_SIZE, [], ''),
+        items=asset_count,
+        assets=asset_count,
+        payload=True
+    )
+    suite.add(
+        'callback.render_ranking_page.sorted_filtered',
+        lambda: app.render_ranking_page(
+            3, RANKING_PAGE_SIZE,
+            [{'column_id': 'Price[€]', 'direction': 'desc'}],
+            '{Change24h[%]} > 0 && {Crypto Name} icontains coin'
+        ),
+        items=asset_count,
+        assets=asset_count,
+        payload=True
+    )
+    page_ids = df_assets['id'].to_list()[:RANKING_PAGE_SIZE]
+    price_moves = itertools.count(1)
+
+    def move_prices():
+        # Every asset gets a new price, so each call patches the whole page
+        cursor = stream.get_cursor()
+        move = next(price_moves)
+        stream.update_quotes({
+            asset: price * (1 + 1e-6 * move)
+            for asset, price in zip(df_assets['id'], df_assets['priceUsd'])
+        })
+        live_state = {'ids': page_ids, 'cursor': cursor - 1}
+        return (live_state,)
+
+    suite.add(
+        'callback.render_ranking_patch',
+        app.render_ranking_patch,
+        setup=move_prices,
+        items=asset_count,
+        assets=asset_count,
+        payload=True
+    )
+    return df_assets
+
+
+def run_range_benchmarks(suite, app, df_assets, range_name):
+    # Building the price matrix is slow for large universes, so it is
+    # skipped when no benchmark of this group was selected
+    if not any(suite.wants(name) for name in RANGE_BENCHMARKS):
+        return
+    import api
+    import utils
+    asset_count = len(df_assets)
+    asset_ids = df_assets['id'].to_list()
+    start, end, interval = get_range_bounds(
+        range_name, dt.datetime.now().replace(microsecond=0)
+    )
+    labels = {'assets': asset_count, 'range_name': range_name}
+    if asset_count == min(suite.args.assets):
+        # Single asset parsers and indicators only depend on the range
+        df_history = suite.add(
+            'parse.get_asset_history',
+            lambda: api.get_asset_history(start, end, 'bitcoin', interval),
+            items=len,
+            range_name=range_name
+        )
+        if df_history is None:
+            df_history = api.get_asset_history(start, end, 'bitcoin', interval)
+        suite.add(
+            'transform.clean_rsi_data',
+            lambda: utils.clean_rsi_data(df_history, window=14),
+            items=len(df_history),
+            range_name=range_name
+        )
+        suite.add(
+            'transform.clean_ma_data',
+            lambda: utils.clean_ma_data(df_history, ma_windows=[50, 180]),
+            items=len(df_history),
+            range_name=range_name
+        )
+    suite.add(
+        'transform.clean_price_data.cold',
+        lambda: utils.clean_price_data(start, end, asset_ids, interval),
+        setup=lambda: clear_price_store() or (),
+        items=lambda df: df.size,
+        repeat=1,
+        warmup=False,
+        **labels
+    )
+    df_prices = suite.add(
+        'transform.clean_price_data.warm',
+        lambda: utils.clean_price_data(start, end, asset_ids, interval),
+        items=lambda df: df.size,
+        **labels
+    )
+    if df_prices is None:
+        df_prices = utils.clean_price_data(start, end, asset_ids, interval)
+    points = df_prices.size
+    install_dataset('main_graph', df_prices)
+    import scheduler
+    df_rates = scheduler.get_dataset('fx_history')
+    suite.add(
+        'transform.convert_price_data',
+        lambda: utils.convert_price_data(df_prices, df_rates, 'EUR'),
+        items=points,
+        **labels
+    )
+    selected_ids = asset_ids[:SELECTED_ASSETS]
+    suite.add(
+        'transform.slice_price_data',
+        lambda: utils.slice_price_data(df_prices, start, end, selected_ids),
+        items=len(df_prices) * len(selected_ids),
+        **labels
+    )
+    suite.add(
+        'transform.build_price_levels',
+        lambda: utils.build_price_levels(df_prices.index),
+        items=len(df_prices),
+        **labels
+    )
+    start_date, end_date = start.isoformat(), end.isoformat()
+
+    def clear_figure_caches():
+        app.get_converted_price_data.cache_clear()
+        app.get_price_levels.cache_clear()
+        app.render_price_trace.cache_clear()
+        return selected_ids, 'EUR', start_date, end_date, None, None
+
+    figure, drawn_traces = suite.add(
+        'callback.display_main_crypto_series',
+        app.display_main_crypto_series,
+        setup=clear_figure_caches,
+        items=len(df_prices) * len(selected_ids),
+        payload=True,
+        **labels
+    ) or app.display_main_crypto_series(*clear_figure_caches())
+    if len(asset_ids) > SELECTED_ASSETS:
+        # One more coin is selected on top of the drawn figure
+        def clear_trace_cache():
+            app.render_price_trace.cache_clear()
+            return (
+                asset_ids[:SELECTED_ASSETS + 1], 'EUR', start_date, end_date,
+                None, drawn_traces
+            )
+
+        suite.add(
+            'callback.display_main_crypto_series.patch',
+            app.display_main_crypto_series,
+            setup=clear_trace_cache,
+            items=len(df_prices),
+            payload=True,
+            **labels
+        )
+
+
+def get_metadata(args):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import numpy
+    import pandas
+    return {
+        'created_at': dt.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'assets': args.assets,
+        'ranges': args.ranges,
+        'repeat': args.repeat,
+        'fixtures': args.fixtures,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    # Benchmarks are matched by name, size and range; a run regresses when
+    # its median time or peak memory grows by more than `threshold`
+    baseline_records = {
+        (record['name'], record['assets'], record['range']): record
+        for record in baseline['results']
+    }
+    regressions = []
+    for record in results:
+        previous = baseline_records.get((record['name'], record['assets'], record['range']))
+        if previous is None:
+            continue
+        for metric in ['median_s', 'peak_memory_bytes', 'payload_bytes']:
+            if record[metric] is None or not previous[metric]:
+                continue
+            ratio = record[metric] / previous[metric]
+            if ratio > 1 + threshold:
+                regressions.append({
+                    'name': record['name'],
+                    'assets': record['assets'],
+                    'range': record['range'],
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': record[metric],
+                    'ratio': ratio,
+                })
+    return regressions
+
+
+def main():
+    args = parse_args()
+    # Paths are resolved before the benchmarks move to their own directory
+    for name in ['fixtures', 'output', 'compare']:
+        value = getattr(args, name)
+        if value is not None and value != '-':
+            setattr(args, name, str(Path(value).resolve()))
+    app = load_app(args.fixtures)
+    suite = Suite(args)
+    run_static_benchmarks(suite, app)
+    for asset_count in sorted(args.assets):
+        df_assets = run_asset_benchmarks(suite, app, asset_count)
+        for range_name in args.ranges:
+            run_range_benchmarks(suite, app, df_assets, range_name)
+    report = {'meta': get_metadata(args), 'results': suite.results}
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        report['regressions'] = find_regressions(suite.results, baseline, args.threshold)
+        for regression in report['regressions']:
+            print(
+                'REGRESSION {name} assets={assets} range={range} {metric}: '
+                '{baseline:.6g} -> {current:.6g} ({ratio:.2f}x)'.format(**regression),
+                file=sys.stderr
+            )
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
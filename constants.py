@@ -1,7 +1,6 @@
-from datetime import datetime
+import os
 
 
-TODAY = datetime.today().strftime('%Y-%m-%d')
 CURRENCY_SYMBOLS = {
     'USD': '$', 
     'PLN': 'zł',
@@ -13,3 +12,68 @@ COLORS = {
     'background': '#111111',
     'text': '#7FDBFF'
 }
+# Max points per trace sent to the main graph; 0 disables downsampling
+MAIN_GRAPH_MAX_POINTS = int(os.environ.get('MAIN_GRAPH_MAX_POINTS', 0))
+# Aggregate levels of the main graph prices, from finest to coarsest, as
+# pandas period codes; each level keeps the close of every period
+PRICE_LEVELS = ('D', 'W', 'M')
+# Min points per trace the main graph is drawn with; the coarsest level that
+# still has them over the selected range is used, 0 always uses the full data
+MAIN_GRAPH_MIN_POINTS = int(os.environ.get('MAIN_GRAPH_MIN_POINTS', 365))
+# Seconds between background refreshes of each dataset
+REFRESH_INTERVALS = {
+    'assets': 60,
+    'exchange_rates': 60 * 60,
+    'main_graph': 60 * 60,
+    'fx_history': 6 * 60 * 60,
+    'fng': 24 * 60 * 60,
+    'rsi': 60 * 60,
+    'ma': 60 * 60,
+}
+# Seconds between retries of datasets that have not loaded yet
+REFRESH_RETRY_INTERVAL = 30
+# Directory shared by all workers to load every dataset only once; unset
+# disables sharing and each process loads its own data
+SHARED_CACHE_DIR = os.environ.get('SHARED_CACHE_DIR')
+# Seconds between checks for a newer version published by another worker
+SHARED_CACHE_POLL_INTERVAL = 10
+# CoinCap-style price feed for the ranking table; empty disables the stream
+# and the table follows the REST assets refreshes instead
+LIVE_PRICES_URL = os.environ.get(
+    'LIVE_PRICES_URL', 'wss://ws.coincap.io/prices?assets=ALL'
+)
+LIVE_PRICES_RECONNECT_INTERVAL = 5
+# Seconds of quotes sent again before a browser's cursor, so prices that a
+# worker received a little later than the one that set the cursor still go out
+LIVE_PRICES_CURSOR_OVERLAP = 2
+# Seconds between pushes of changed prices to the browser
+LIVE_PRICES_UPDATE_INTERVAL = 5
+# Seconds between readiness checks of a page loaded while datasets were
+# still loading, until its placeholders are all replaced
+READINESS_POLL_INTERVAL = 5
+# Compact dtypes: float32 price matrices and indicators, int8 and categorical
+# fear and greed columns; roughly halves the memory of each worker
+COMPACT_DTYPES = bool(int(os.environ.get('COMPACT_DTYPES', 0)))
+PRICE_DTYPE = 'float32' if COMPACT_DTYPES else 'float64'
+FNG_DTYPES = (
+    {'value': 'int8', 'value_classification': 'category'}
+    if COMPACT_DTYPES else {'value': 'int64'}
+)
+# Number of top ranked assets listed in the ranking table, fetched in pages
+RANKING_UNIVERSE_SIZE = int(os.environ.get('RANKING_UNIVERSE_SIZE', 2000))
+ASSETS_PAGE_SIZE = 500
+# Rows per page of the ranking table
+RANKING_PAGE_SIZE = 10
+# Number of top ranked assets with price history in the main graph
+MAIN_GRAPH_ASSETS = 10
+# Directory of the on-disk cache of raw upstream responses; empty disables it
+HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', 'http_cache')
+# Max size in bytes of the cached responses, least recently used go first
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Seconds a cached response is served without asking upstream, per endpoint
+HTTP_CACHE_TTLS = {
+    'assets': 30,
+    'history': 60 * 60,
+    'fng': 6 * 60 * 60,
+    'fx_history': 6 * 60 * 60,
+}
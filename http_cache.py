@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+from constants import HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_TTLS
+
+
+logger = logging.getLogger(__name__)
+
+# Errors of a missing, partly written or corrupted entry, which is then
+# treated as a miss instead of failing the fetch
+READ_ERRORS = (OSError, ValueError, KeyError, zlib.error)
+
+
+def is_enabled():
+    return bool(HTTP_CACHE_DIR)
+
+
+def get_entry_path(key):
+    # Keys are hashed, so API keys in query strings are not written to disk
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return Path(HTTP_CACHE_DIR) / f'{digest}.bin'
+
+
+def read_entry(key):
+    # An entry is a JSON header line followed by the zlib compressed body
+    path = get_entry_path(key)
+    try:
+        header, payload = path.read_bytes().split(b'\n', 1)
+        entry = dict(json.loads(header), payload=payload)
+        # The modification time tracks the last use for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except READ_ERRORS as error:
+        logger.warning('Ignoring unreadable cached response %s: %r', path.name, error)
+        return None
+    return entry
+
+
+def get_content(entry):
+    return zlib.decompress(entry['payload'])
+
+
+def is_fresh(entry, endpoint):
+    return time.time() - entry['stored_at'] < HTTP_CACHE_TTLS[endpoint]
+
+
+def get_validators(entry):
+    # Conditional request headers, so an unchanged response comes back as
+    # an empty 304 instead of the full payload
+    headers = {}
+    if entry is None:
+        return headers
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def write_entry(key, response, payload=None):
+    # A 304 passes the payload of the entry it revalidated, along with the
+    # validators it may have updated
+    if payload is None:
+        payload = zlib.compress(response.content)
+    header = {
+        'stored_at': time.time(),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    path = get_entry_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file and renamed, so concurrent readers
+        # never see a partial entry
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(json.dumps(header).encode() + b'\n' + payload)
+        os.replace(temp_name, path)
+    except OSError as error:
+        logger.warning('Caching response %s failed: %r', path.name, error)
+        return
+    evict_entries()
+
+
+def evict_entries(max_bytes=HTTP_CACHE_MAX_BYTES):
+    # Least recently used entries are removed until the cache fits
+    entries = []
+    for path in Path(HTTP_CACHE_DIR).glob('*.bin'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
@@ -0,0 +1,17 @@
+def sma(prices, window):
+    return prices.rolling(window=window, min_periods=window).mean()
+
+
+def ema(prices, window):
+    return prices.ewm(span=window, adjust=False, min_periods=window).mean()
+
+
+def rsi(prices, window=14):
+    # Gains and losses are smoothed with Wilder's moving average, which is
+    # an exponential average with alpha = 1 / window
+    delta = prices.diff()
+    gains = delta.clip(lower=0)
+    losses = -delta.clip(upper=0)
+    avg_gain = gains.ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    avg_loss = losses.ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    return 100 - 100 / (1 + avg_gain / avg_loss)
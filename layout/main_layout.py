@@ -2,11 +2,16 @@ import datetime as dt
 
 from dash import html, dcc
 
-from constants import CURRENCY_SYMBOLS, TODAY
+from constants import (
+    CURRENCY_SYMBOLS, LIVE_PRICES_UPDATE_INTERVAL, READINESS_POLL_INTERVAL
+)
 from layout.tab_sections import ranking, fng, ma, rsi 
 
 
-def render_layout(asset_names, df_fng):
+def render_layout(asset_names, df_fng, fiat_rates, indicator_figures,
+                  ready_datasets, is_loading):
+    # Rendered on every page load, so the end date follows the current day
+    today = dt.date.today().isoformat()
     title = (
         html.H1(
             children="Dash application for cryptocurrencies monitoring",
@@ -64,9 +69,9 @@ def render_layout(asset_names, df_fng):
                             dcc.DatePickerSingle(
                                 id='end-date-picker',
                                 min_date_allowed=dt.datetime(2015, 1, 1),
-                                max_date_allowed=TODAY,
-                                date=TODAY,
-                                initial_visible_month=TODAY,
+                                max_date_allowed=today,
+                                date=today,
+                                initial_visible_month=today,
                             ),
                         ),
                     ],
@@ -78,10 +83,43 @@ def render_layout(asset_names, df_fng):
     )
     crypto_graph = (
         html.Section(
-            dcc.Graph(id='crypto-graph'),
+            children=[
+                dcc.Graph(id='crypto-graph'),
+                dcc.Store(id='crypto-graph-traces'),
+            ],
             className='graph-container'
         )
     )
+    # Exchange rates and full indicator figures are shipped once per page
+    # load, the USD ranking page is requested by the table; currency
+    # conversion and slicing are done in the browser
+    data_stores = (
+        html.Div(
+            children=[
+                dcc.Store(
+                    id='fiat-rates-store',
+                    data={'rates': fiat_rates, 'symbols': CURRENCY_SYMBOLS}
+                ),
+                dcc.Store(id='crypto-table-usd'),
+                dcc.Store(id='ranking-live-state'),
+                dcc.Interval(
+                    id='ranking-live-interval',
+                    interval=LIVE_PRICES_UPDATE_INTERVAL * 1000
+                ),
+                dcc.Store(id='fng-figure-store', data=indicator_figures['fng']),
+                dcc.Store(id='rsi-figure-store', data=indicator_figures['rsi']),
+                dcc.Store(id='ma-figure-store', data=indicator_figures['ma']),
+                # Datasets that were ready when the page was rendered; the
+                # interval runs until the others have loaded
+                dcc.Store(id='ready-datasets', data=ready_datasets),
+                dcc.Interval(
+                    id='readiness-interval',
+                    interval=READINESS_POLL_INTERVAL * 1000,
+                    disabled=not is_loading
+                ),
+            ]
+        )
+    )
     crypto_tabs = html.Div(
         [
             dcc.Tabs([
@@ -107,7 +145,10 @@ def render_layout(asset_names, df_fng):
                 dcc.Tab(
                     label='Fear and Greed Index',
                     children=[
-                        fng.render_fng_table(df_fng),
+                        html.Div(
+                            id='fng-table-container',
+                            children=fng.render_fng_table(df_fng)
+                        ),
                         fng.fng_selector_graph,
                         fng.fng_info_button
                     ],
@@ -169,6 +210,7 @@ def render_layout(asset_names, df_fng):
         className="main",
         children=[
             title,
+            data_stores,
             crypto_params_selector,
             crypto_graph,
             crypto_tabs,
@@ -6,6 +6,11 @@ from utils import resample_df_fng
 
 
 def render_fng_table(df_fng):
+    if df_fng is None:
+        return html.Section(
+            html.P('Fear and Greed Index data is still loading...'),
+            className='main-fng-box'
+        )
     df_fng_sampled = resample_df_fng(df_fng)
     fng_gauge_table = (
         html.Section(
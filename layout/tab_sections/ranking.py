@@ -2,7 +2,7 @@ import dash_daq as daq
 import dash_bootstrap_components as dbc
 from dash import html, dash_table
 
-from constants import COLORS, CURRENCY_SYMBOLS
+from constants import COLORS, CURRENCY_SYMBOLS, RANKING_PAGE_SIZE
 
 
 warning_alert = (
@@ -82,6 +82,14 @@ crypto_prices_table = (
             dash_table.DataTable(
                 id='crypto-table',
                 merge_duplicate_headers=True,
+                page_action='custom',
+                page_current=0,
+                page_size=RANKING_PAGE_SIZE,
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
                 fill_width=False,
                 style_header={
                     'backgroundColor': 'rgb(30, 30, 30)',
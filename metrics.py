@@ -0,0 +1,120 @@
+import threading
+
+
+# Upper bounds of the histogram buckets, in seconds and in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS = {
+    'dash_callback_duration_seconds': (
+        'histogram', LATENCY_BUCKETS, 'Latency of Dash callback requests'
+    ),
+    'dash_callback_response_bytes': (
+        'histogram', SIZE_BUCKETS, 'Size of Dash callback responses'
+    ),
+    'dash_callback_requests_total': (
+        'counter', None, 'Dash callback requests by response status'
+    ),
+    'dash_callback_errors_total': (
+        'counter', None, 'Dash callback requests that failed with a server error'
+    ),
+    'upstream_request_duration_seconds': (
+        'histogram', LATENCY_BUCKETS, 'Latency of single upstream HTTP attempts'
+    ),
+    'upstream_response_bytes': (
+        'histogram', SIZE_BUCKETS, 'Size of upstream HTTP responses'
+    ),
+    'upstream_requests_total': (
+        'counter', None, 'Upstream HTTP attempts by status code or error type'
+    ),
+    'upstream_retries_total': (
+        'counter', None, 'Upstream HTTP attempts that were retried'
+    ),
+    'upstream_cache_requests_total': (
+        'counter', None, 'Fetches served from, revalidated against or missing the response cache'
+    ),
+    'upstream_coalesced_total': (
+        'counter', None, 'Fetches that waited for an identical fetch already in flight'
+    ),
+    'upstream_fetch_errors_total': (
+        'counter', None, 'Fetches that fell back to an empty result'
+    ),
+    'dataset_refresh_duration_seconds': (
+        'histogram', LATENCY_BUCKETS, 'Duration of background dataset refreshes'
+    ),
+    'dataset_refresh_errors_total': (
+        'counter', None, 'Background dataset refreshes that failed or came back empty'
+    ),
+}
+# (metric name, sorted label pairs) -> counter value or histogram state
+SAMPLES = {}
+SAMPLES_LOCK = threading.Lock()
+
+
+def get_key(name, labels):
+    # Label values are kept as strings, so samples whose label is a status
+    # code and samples whose label is an error name can be sorted together
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def increment(name, labels, amount=1):
+    key = get_key(name, labels)
+    with SAMPLES_LOCK:
+        SAMPLES[key] = SAMPLES.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    # Histograms keep one count per bucket plus the sum and count of all
+    # observations; buckets are made cumulative when rendered
+    buckets = METRICS[name][1]
+    key = get_key(name, labels)
+    with SAMPLES_LOCK:
+        histogram = SAMPLES.get(key)
+        if histogram is None:
+            histogram = SAMPLES[key] = {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+        for index, upper_bound in enumerate(buckets):
+            if value <= upper_bound:
+                histogram['buckets'][index] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(label_pairs):
+    if not label_pairs:
+        return ''
+    return '{' + ','.join(
+        f'{label}="{escape_label(value)}"' for label, value in label_pairs
+    ) + '}'
+
+
+def render_metrics():
+    with SAMPLES_LOCK:
+        samples = {
+            key: dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value
+            for key, value in SAMPLES.items()
+        }
+    lines = []
+    for name, (metric_type, buckets, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for (sample_name, label_pairs), value in sorted(samples.items()):
+            if sample_name != name:
+                continue
+            if metric_type == 'counter':
+                lines.append(f'{name}{format_labels(label_pairs)} {value}')
+                continue
+            cumulative = 0
+            for upper_bound, count in zip(buckets, value['buckets']):
+                cumulative += count
+                bucket_labels = format_labels(label_pairs + (('le', upper_bound),))
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            bucket_labels = format_labels(label_pairs + (('le', '+Inf'),))
+            lines.append(f'{name}_bucket{bucket_labels} {value["count"]}')
+            lines.append(f'{name}_sum{format_labels(label_pairs)} {value["sum"]}')
+            lines.append(f'{name}_count{format_labels(label_pairs)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -1,18 +1,41 @@
+import datetime as dt
+
 import pandas as pd
-from sqlalchemy import create_engine, Column, Date, String, Integer, Float
+from sqlalchemy import (
+    create_engine, event, func, insert, select,
+    Column, Date, String, Integer, BigInteger, Float,
+)
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 
-engine = create_engine('sqlite:///exchange_rates_cache.db', echo=False)
+# Connections are pooled and may be used from any thread, every call
+# checks out its own connection or session instead of sharing one
+engine = create_engine(
+    'sqlite:///exchange_rates_cache.db',
+    echo=False,
+    pool_size=5,
+    max_overflow=10,
+    connect_args={'check_same_thread': False, 'timeout': 30},
+)
 base = declarative_base()
 db_session = sessionmaker(bind=engine)
-session = db_session()
+
+
+@event.listens_for(engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run concurrently with a writer
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=30000')
+    cursor.close()
 
 
 class ExchangeRates(base):
     __tablename__ = "exchange_rates"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    date = Column(String)
+    date = Column(String, index=True)
     USD = Column(Float)
     PLN = Column(Float)
     EUR = Column(Float)
@@ -28,22 +51,131 @@ class ExchangeRates(base):
         self.CHF = CHF
 
 
-base.metadata.create_all(engine)
+class ExchangeRateHistory(base):
+    # ECB reference rates, kept apart from the spot rates saved above so a
+    # spot rate for today never hides days missing from the history
+    __tablename__ = "exchange_rate_history"
+    date = Column(String, primary_key=True)
+    USD = Column(Float)
+    PLN = Column(Float)
+    EUR = Column(Float)
+    GBP = Column(Float)
+    CHF = Column(Float)
+
+
+class PriceHistory(base):
+    __tablename__ = "price_history"
+    asset = Column(String, primary_key=True)
+    interval = Column(String, primary_key=True)
+    time = Column(BigInteger, primary_key=True) # Unix time in miliseconds
+    priceUsd = Column(Float)
+
+
+def create_tables():
+    # Indexes are created separately, so databases created before an index
+    # was declared get it too. Several workers may start on a fresh database
+    # at once, so a lost creation race is retried against the existing tables
+    for attempt in range(2):
+        try:
+            base.metadata.create_all(engine)
+            for table in base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
+            return
+        except OperationalError:
+            if attempt == 1:
+                raise
+
+
+create_tables()
 
 
 def get_exchange_rates(date):
     query = (
-        session
-        .query(ExchangeRates)
-        .filter(ExchangeRates.date == date)
+        select(ExchangeRates)
+        .where(ExchangeRates.date == date)
         .order_by(ExchangeRates.id.desc())
         .limit(1)
     )
-    df = pd.read_sql(con=engine, sql=query.statement)
+    with engine.connect() as conn:
+        df = pd.read_sql(con=conn, sql=query)
+    return df
+
+
+def get_exchange_rate_history(start_date, end_date):
+    query = (
+        select(ExchangeRateHistory)
+        .where(ExchangeRateHistory.date.between(str(start_date), str(end_date)))
+        .order_by(ExchangeRateHistory.date)
+    )
+    with engine.connect() as conn:
+        df = pd.read_sql(con=conn, sql=query)
     return df
 
 
 def save_exchange_rates(record):
-    obj = ExchangeRates(**record)
-    session.add(obj)
-    session.commit()
+    with db_session.begin() as session:
+        session.add(ExchangeRates(**record))
+
+
+def save_exchange_rate_history(records):
+    if not records:
+        return
+    # Dates fetched twice, e.g. by concurrent workers, are overwritten
+    query = insert(ExchangeRateHistory).prefix_with('OR REPLACE')
+    with engine.begin() as conn:
+        conn.execute(query, records)
+
+
+def get_price_time_range(asset, interval):
+    # SQLite only answers a lone min or max from the primary key index, so
+    # each bound gets its own subquery instead of scanning the asset's rows
+    condition = (PriceHistory.asset == asset, PriceHistory.interval == interval)
+    query = select(
+        select(func.min(PriceHistory.time)).where(*condition).scalar_subquery(),
+        select(func.max(PriceHistory.time)).where(*condition).scalar_subquery(),
+    )
+    with engine.connect() as conn:
+        first_time, last_time = conn.execute(query).one()
+    return first_time, last_time
+
+
+def get_price_history(asset, interval, start, end):
+    unix_start = int(start.replace(tzinfo=dt.timezone.utc).timestamp() * 1000)
+    unix_end = int(end.replace(tzinfo=dt.timezone.utc).timestamp() * 1000)
+    query = (
+        select(PriceHistory.priceUsd, PriceHistory.time)
+        .where(
+            PriceHistory.asset == asset,
+            PriceHistory.interval == interval,
+            PriceHistory.time.between(unix_start, unix_end),
+        )
+        .order_by(PriceHistory.time)
+    )
+    df = (
+        pd
+        .read_sql(con=engine, sql=query)
+        .astype({'priceUsd': 'float64', 'time': 'datetime64[ms]'})
+        .rename(columns={'time': 'timestamp'})
+    )
+    return df
+
+
+def save_price_history(df, asset, interval):
+    if df.empty:
+        return
+    records = (
+        df
+        .assign(
+            asset=asset,
+            interval=interval,
+            time=df['timestamp'].values.astype('datetime64[ms]').astype('int64'),
+        )
+        .loc[:, ['asset', 'interval', 'time', 'priceUsd']]
+        .to_dict('records')
+    )
+    # Points already stored are overwritten, so the latest (possibly still
+    # open) interval gets refreshed on every backfill
+    query = insert(PriceHistory).prefix_with('OR REPLACE')
+    with engine.begin() as conn:
+        conn.execute(query, records)
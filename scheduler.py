@@ -0,0 +1,202 @@
+import datetime as dt
+import functools as ft
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+import metrics
+import shared_cache
+from constants import REFRESH_RETRY_INTERVAL, SHARED_CACHE_POLL_INTERVAL
+
+
+logger = logging.getLogger(__name__)
+
+Snapshot = namedtuple('Snapshot', ['value', 'version', 'updated_at'])
+
+DATASETS = {}
+SNAPSHOTS = {}
+ERRORS = {}
+SHARED_STAMPS = {}
+STOP_EVENT = threading.Event()
+UNCHANGED = object()
+
+
+def register_dataset(name, loader, interval):
+    DATASETS[name] = {'loader': loader, 'interval': interval}
+    SNAPSHOTS[name] = Snapshot(None, 0, None)
+    ERRORS[name] = None
+
+
+def get_dataset(name):
+    return SNAPSHOTS[name].value
+
+
+def get_version(name):
+    return SNAPSHOTS[name].version
+
+
+def get_snapshot(name):
+    # The value and its version from a single read, so a refresh landing in
+    # between cannot pair one version with another version's value
+    return SNAPSHOTS[name]
+
+
+def cache_by_version(maxsize):
+    # Like ft.lru_cache, except that snapshot arguments are keyed by their
+    # version alone: results are built from the very snapshot whose version
+    # keys them, and keys do not keep old datasets alive
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @ft.wraps(func)
+        def wrapper(*args):
+            key = tuple(
+                ('snapshot', arg.version) if isinstance(arg, Snapshot) else arg
+                for arg in args
+            )
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            result = func(*args)
+            with lock:
+                cache[key] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+def is_ready(name):
+    return SNAPSHOTS[name].version > 0
+
+
+def get_status():
+    status = {}
+    for name, snapshot in SNAPSHOTS.items():
+        status[name] = {
+            'ready': snapshot.version > 0,
+            'version': snapshot.version,
+            'updated_at': (
+                snapshot.updated_at.isoformat()
+                if snapshot.updated_at is not None else None
+            ),
+            'error': ERRORS[name],
+        }
+    return status
+
+
+def is_empty(value):
+    if isinstance(value, pd.DataFrame):
+        return value.empty
+    if isinstance(value, tuple):
+        return any(is_empty(item) for item in value)
+    return not value
+
+
+def load_shared_dataset(name):
+    # One worker loads a stale dataset and publishes it to the shared
+    # cache, the rest pick up the published version
+    with shared_cache.try_lock(name) as is_locked:
+        stamp = shared_cache.read_stamp(name)
+        if is_locked and shared_cache.is_stale(stamp, DATASETS[name]['interval']):
+            value = DATASETS[name]['loader']()
+            if not is_empty(value):
+                SHARED_STAMPS[name] = shared_cache.write_dataset(name, value)
+            return value
+    if stamp is None or stamp == SHARED_STAMPS.get(name):
+        return UNCHANGED
+    value = shared_cache.read_dataset(name, stamp)
+    SHARED_STAMPS[name] = stamp
+    return value
+
+
+def refresh_dataset(name):
+    # The new value is built off the request path and published with a
+    # single dict assignment, so readers always get a complete snapshot
+    labels = {'dataset': name}
+    start = time.perf_counter()
+    try:
+        if shared_cache.is_enabled():
+            value = load_shared_dataset(name)
+        else:
+            value = DATASETS[name]['loader']()
+    except Exception as error:
+        logger.exception('Refreshing dataset %s failed', name)
+        ERRORS[name] = repr(error)
+        metrics.increment(
+            'dataset_refresh_errors_total', dict(labels, error=type(error).__name__)
+        )
+        return
+    finally:
+        metrics.observe(
+            'dataset_refresh_duration_seconds', labels, time.perf_counter() - start
+        )
+    if value is UNCHANGED:
+        return
+    if is_empty(value):
+        logger.warning('Dataset %s came back empty, keeping previous data', name)
+        ERRORS[name] = 'Empty response'
+        metrics.increment(
+            'dataset_refresh_errors_total', dict(labels, error='Empty response')
+        )
+        return
+    previous = SNAPSHOTS[name]
+    SNAPSHOTS[name] = Snapshot(value, previous.version + 1, dt.datetime.now())
+    ERRORS[name] = None
+
+
+def load_datasets():
+    # Datasets are loaded in registration order, so a loader can rely on
+    # datasets registered before it
+    for name in DATASETS:
+        refresh_dataset(name)
+
+
+def run_refresh_loop(name):
+    # Datasets that have not loaded yet are retried sooner than their
+    # regular refresh interval
+    while True:
+        if is_ready(name):
+            interval = DATASETS[name]['interval']
+        else:
+            interval = REFRESH_RETRY_INTERVAL
+        if shared_cache.is_enabled():
+            interval = min(interval, SHARED_CACHE_POLL_INTERVAL)
+        if STOP_EVENT.wait(interval):
+            return
+        refresh_dataset(name)
+
+
+def run_scheduler():
+    load_datasets()
+    for name in DATASETS:
+        thread = threading.Thread(
+            target=run_refresh_loop,
+            args=(name,),
+            name=f'refresh-{name}',
+            daemon=True
+        )
+        thread.start()
+
+
+def start_scheduler():
+    # The first load runs in the background as well, so the app can bind
+    # and serve placeholders while data is still being fetched
+    thread = threading.Thread(
+        target=run_scheduler,
+        name='refresh-scheduler',
+        daemon=True
+    )
+    thread.start()
@@ -0,0 +1,120 @@
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from constants import SHARED_CACHE_DIR
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows
+    fcntl = None
+
+
+def is_enabled():
+    return SHARED_CACHE_DIR is not None and fcntl is not None
+
+
+def get_dataset_dir(name):
+    dataset_dir = Path(SHARED_CACHE_DIR) / name
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    return dataset_dir
+
+
+@contextlib.contextmanager
+def try_lock(name):
+    # Only the worker holding the lock loads the dataset from upstream,
+    # the others keep serving the last published version
+    with open(get_dataset_dir(name) / 'loader.lock', 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_stamp(name):
+    try:
+        return (get_dataset_dir(name) / 'CURRENT').read_text()
+    except FileNotFoundError:
+        return None
+
+
+def is_stale(stamp, interval):
+    if stamp is None:
+        return True
+    return time.time() - int(stamp) / 1e9 >= interval
+
+
+def is_matrix(value):
+    return (
+        isinstance(value, pd.DataFrame) and
+        not value.empty and
+        value.dtypes.iloc[0] in (np.float32, np.float64) and
+        all(dtype == value.dtypes.iloc[0] for dtype in value.dtypes)
+    )
+
+
+def write_dataset(name, value):
+    dataset_dir = get_dataset_dir(name)
+    stamp = str(time.time_ns())
+    version_dir = dataset_dir / stamp
+    version_dir.mkdir()
+    if is_matrix(value):
+        # Float frames such as the main graph prices are stored as raw
+        # arrays, so every worker can memory-map the same pages
+        np.save(version_dir / 'values.npy', value.to_numpy())
+        np.save(version_dir / 'index.npy', value.index.values)
+        meta = {
+            'format': 'matrix',
+            'columns': value.columns.to_list(),
+            'index_name': value.index.name,
+        }
+    else:
+        with open(version_dir / 'value.pkl', 'wb') as value_file:
+            pickle.dump(value, value_file, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {'format': 'pickle'}
+    (version_dir / 'meta.json').write_text(json.dumps(meta))
+    # The stamp file is replaced atomically, so readers never see a
+    # version that is still being written
+    (dataset_dir / 'CURRENT.tmp').write_text(stamp)
+    os.replace(dataset_dir / 'CURRENT.tmp', dataset_dir / 'CURRENT')
+    remove_old_versions(dataset_dir, keep=2)
+    return stamp
+
+
+def read_dataset(name, stamp):
+    version_dir = get_dataset_dir(name) / stamp
+    meta = json.loads((version_dir / 'meta.json').read_text())
+    if meta['format'] == 'matrix':
+        values = np.load(version_dir / 'values.npy', mmap_mode='r')
+        index = np.load(version_dir / 'index.npy')
+        return pd.DataFrame(
+            values,
+            index=pd.Index(index, name=meta['index_name']),
+            columns=meta['columns'],
+            copy=False
+        )
+    with open(version_dir / 'value.pkl', 'rb') as value_file:
+        return pickle.load(value_file)
+
+
+def remove_old_versions(dataset_dir, keep):
+    # Workers that still map a removed version keep reading it until they
+    # switch, the files are only freed once they are unmapped
+    version_dirs = sorted(
+        (path for path in dataset_dir.iterdir() if path.is_dir()),
+        key=lambda path: int(path.name)
+    )
+    for version_dir in version_dirs[:-keep]:
+        shutil.rmtree(version_dir, ignore_errors=True)
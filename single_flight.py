@@ -0,0 +1,34 @@
+import threading
+
+
+IN_FLIGHT = {}
+IN_FLIGHT_LOCK = threading.Lock()
+
+
+def run(key, func):
+    # The first caller of a key runs `func`, callers arriving while it runs
+    # wait for it and share its result or error; returns the result and
+    # whether it was shared
+    with IN_FLIGHT_LOCK:
+        call = IN_FLIGHT.get(key)
+        is_shared = call is not None
+        if not is_shared:
+            call = IN_FLIGHT[key] = {
+                'done': threading.Event(), 'result': None, 'error': None
+            }
+    if is_shared:
+        call['done'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result'], True
+    try:
+        call['result'] = func()
+    except Exception as error:
+        call['error'] = error
+        raise
+    finally:
+        # Later callers start a new fetch, the result is not cached here
+        with IN_FLIGHT_LOCK:
+            del IN_FLIGHT[key]
+        call['done'].set()
+    return call['result'], False
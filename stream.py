@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+import time
+
+from constants import (
+    LIVE_PRICES_URL, LIVE_PRICES_CURSOR_OVERLAP, LIVE_PRICES_RECONNECT_INTERVAL
+)
+
+try:
+    import websocket
+except ImportError: # websocket-client is optional, REST snapshots are used
+    websocket = None
+
+
+logger = logging.getLogger(__name__)
+
+# asset -> (price, time the price changed, in miliseconds since the epoch)
+QUOTES = {}
+QUOTES_LOCK = threading.Lock()
+STREAM_STATE = {'connected': False, 'assets_version': 0}
+STOP_EVENT = threading.Event()
+
+
+def get_cursor():
+    # Cursors are wall clock times, not counters of this process, so a
+    # browser's cursor means the same whichever worker its next poll reaches
+    return time.time_ns() // 1_000_000
+
+
+def update_quotes(prices):
+    # Every changed price is stamped with the time it changed, so clients
+    # only receive the quotes that moved since their last poll
+    with QUOTES_LOCK:
+        updated_at = get_cursor()
+        for asset, price in prices.items():
+            price = float(price)
+            previous = QUOTES.get(asset)
+            if previous is not None and previous[0] == price:
+                continue
+            QUOTES[asset] = (price, updated_at)
+
+
+def update_quotes_from_assets(df_assets, version):
+    # REST snapshots stand in for the feed while it is not connected; a
+    # snapshot is only applied once per dataset version
+    if STREAM_STATE['connected'] or version == STREAM_STATE['assets_version']:
+        return
+    STREAM_STATE['assets_version'] = version
+    update_quotes(dict(zip(df_assets['id'], df_assets['priceUsd'])))
+
+
+def get_quotes():
+    with QUOTES_LOCK:
+        return {asset: price for asset, (price, _) in QUOTES.items()}
+
+
+def get_quotes_since(cursor):
+    # Workers receive the same price at slightly different times, so quotes
+    # from a short overlap before the cursor are sent again
+    since = cursor - LIVE_PRICES_CURSOR_OVERLAP * 1000
+    with QUOTES_LOCK:
+        next_cursor = get_cursor()
+        quotes = {
+            asset: price
+            for asset, (price, updated_at) in QUOTES.items()
+            if updated_at > since
+        }
+    return quotes, next_cursor
+
+
+def on_message(ws, message):
+    try:
+        update_quotes(json.loads(message))
+    except (ValueError, TypeError):
+        logger.warning('Skipping malformed price message %r', message[:200])
+
+
+def on_open(ws):
+    STREAM_STATE['connected'] = True
+
+
+def on_close(ws, *args):
+    STREAM_STATE['connected'] = False
+
+
+def run_stream():
+    while not STOP_EVENT.is_set():
+        ws_app = websocket.WebSocketApp(
+            LIVE_PRICES_URL,
+            on_open=on_open,
+            on_message=on_message,
+            on_close=on_close
+        )
+        try:
+            ws_app.run_forever(ping_interval=30, ping_timeout=10)
+        except Exception:
+            logger.exception('Price stream failed')
+        STREAM_STATE['connected'] = False
+        STOP_EVENT.wait(LIVE_PRICES_RECONNECT_INTERVAL)
+
+
+def start_stream():
+    if websocket is None or not LIVE_PRICES_URL:
+        logger.info('Price stream disabled, using REST snapshots')
+        return
+    thread = threading.Thread(
+        target=run_stream,
+        name='price-stream',
+        daemon=True
+    )
+    thread.start()
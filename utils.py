@@ -1,62 +1,208 @@
 import datetime as dt
-import functools as ft
+import re
+from concurrent.futures import ThreadPoolExecutor
+from operator import eq, ge, gt, le, lt, ne
 
 import numpy as np
 import pandas as pd
 
 import api
+import indicators
 import models
+from constants import CURRENCY_SYMBOLS, PRICE_DTYPE, PRICE_LEVELS
 
 
-def clean_price_data(start, end, currencies):
-    list_of_dfs = []
-    for currency in currencies:
-        df = api.get_asset_history(start, end, currency)
-        df_cleaned = df.rename(columns={'priceUsd': f'{currency}'})
-        list_of_dfs.append(df_cleaned)
-    df_main_graph = (
-        ft.reduce(
-            lambda x, y: pd.merge(x, y, on=['timestamp'], how='outer'),
-            list_of_dfs
+# Ranking columns shown in the base currency, with their displayed decimals
+RANKING_CURRENCY_COLUMNS = {'Price': ('priceUsd', 4), 'MarketCap': ('marketCapUsd', 2)}
+SYMBOL_CURRENCIES = {symbol: currency for currency, symbol in CURRENCY_SYMBOLS.items()}
+FILTER_PATTERN = re.compile(r'\{(?P<column>[^}]+)\}\s*(?P<operator>[si]?[<>!=]=?|[a-z]+)\s*(?P<value>.*)')
+FILTER_OPERATORS = {
+    '=': eq, 'eq': eq, '!=': ne, 'ne': ne,
+    '<': lt, 'lt': lt, '<=': le, 'le': le,
+    '>': gt, 'gt': gt, '>=': ge, 'ge': ge,
+    'contains': None, 'datestartswith': None,
+}
+
+
+def clean_price_data(start, end, currencies, interval='d1', max_workers=8):
+    # Histories are fetched in parallel, with at most `max_workers`
+    # requests in flight; max_workers=1 falls back to sequential fetching
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        dfs = executor.map(
+            lambda currency: load_asset_history(start, end, currency, interval),
+            currencies
         )
-        .fillna(0)
-        .sort_values(by=['timestamp'])
+        list_of_dfs = list(dfs)
+    # All series are aligned in a single pass on the sorted union of their
+    # timestamps, which becomes the index; missing points are left as 0
+    timestamps = np.unique(np.concatenate(
+        [df['timestamp'].values for df in list_of_dfs] or
+        [np.array([], dtype='datetime64[ms]')]
+    ))
+    prices = np.zeros((len(timestamps), len(list_of_dfs)), dtype=PRICE_DTYPE)
+    for col, df in enumerate(list_of_dfs):
+        rows = np.searchsorted(timestamps, df['timestamp'].values)
+        prices[rows, col] = df['priceUsd'].values
+    prices[np.isnan(prices)] = 0
+    df_main_graph = pd.DataFrame(
+        prices,
+        index=pd.DatetimeIndex(timestamps, name='timestamp'),
+        columns=list(currencies)
     )
     return df_main_graph
 
 
-def clean_ma_data(ma_windows, ma_types):
-    dfs_by_window = {}
-    for ma_window in ma_windows:
-        dfs_by_type = {}
-        for ma_type in ma_types:
-            dfs_by_type[ma_type] = api.get_ma_data(ma_window, ma_type)
-        dfs_by_window[ma_window] = (
-            pd
-            .merge(dfs_by_type['sma'], dfs_by_type['ema'], on='timestamp', how='left')
-            .rename(columns={'value_x': 'SMA', 'value_y': 'EMA'})
-            .sort_values(by=['timestamp'])
-        )
-    df_ma50 = dfs_by_window['50']
-    start_datetime = df_ma50["timestamp"].min() 
-    end_datetime = df_ma50["timestamp"].max()
-    if (start_datetime is np.nan) and (end_datetime is np.nan):
-        return tuple(dfs_by_window.values())
+def slice_price_data(df, start, end, columns, level_rows=None):
+    # The index is sorted, so the range is found by binary search and only
+    # the requested columns get copied; with the rows of an aggregate level,
+    # only those within the range are kept, plus its first and last rows so
+    # the series still spans the whole range
+    start_row = df.index.searchsorted(start, side='left')
+    end_row = df.index.searchsorted(end, side='right')
+    if level_rows is None or start_row >= end_row:
+        return df.iloc[start_row:end_row].loc[:, columns]
+    rows = np.unique(np.concatenate((
+        [start_row],
+        level_rows[level_rows.searchsorted(start_row):level_rows.searchsorted(end_row)],
+        [end_row - 1]
+    )))
+    df_sliced = df.iloc[rows].loc[:, columns]
+    return df_sliced
+
+
+def build_price_levels(index, freqs=PRICE_LEVELS):
+    # Each level holds the positions of the last row of every period, so it
+    # is a view of the price matrix with the close of each period, whatever
+    # the base currency; levels that would not drop any row are skipped
+    levels = {}
+    if len(index) == 0:
+        return levels
+    level_size = len(index)
+    for freq in freqs:
+        periods = index.to_period(freq).asi8
+        rows = np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+        if len(rows) < level_size:
+            levels[freq] = rows
+            level_size = len(rows)
+    return levels
+
+
+def select_price_level(levels, index, start, end, min_points):
+    # The coarsest level with at least `min_points` in the range, None for
+    # the full data
+    start_row = index.searchsorted(start, side='left')
+    end_row = index.searchsorted(end, side='right')
+    for freq in reversed(list(levels)):
+        rows = levels[freq]
+        if rows.searchsorted(end_row) - rows.searchsorted(start_row) >= min_points:
+            return freq
+    return None
+
+
+def load_asset_history(start, end, currency, interval='d1'):
+    # Only the ranges before the first and after the last stored point are
+    # requested upstream, the rest is served from the local price history
+    # store; a head shorter than one interval holds no point to fetch
+    first_time, last_time = models.get_price_time_range(currency, interval)
+    missing_ranges = []
+    if last_time is None:
+        missing_ranges.append((start, end))
     else:
-        df_btc_price = api.get_asset_history(
-            start=df_ma50["timestamp"].min(),
-            end=df_ma50["timestamp"].max(),
-            currency='bitcoin',
-            interval='h1'
+        epoch = dt.datetime(1970, 1, 1)
+        first_stored = epoch + dt.timedelta(milliseconds=first_time)
+        last_stored = epoch + dt.timedelta(milliseconds=last_time)
+        step = dt.timedelta(milliseconds=api.HISTORY_INTERVALS.get(interval, 1))
+        if first_stored - start >= step:
+            missing_ranges.append((start, min(first_stored, end)))
+        missing_ranges.append((max(start, last_stored), end))
+    for fetch_start, fetch_end in missing_ranges:
+        if fetch_start < fetch_end:
+            df_new = api.get_asset_history(fetch_start, fetch_end, currency, interval)
+            models.save_price_history(df_new, currency, interval)
+    df = models.get_price_history(currency, interval, start, end)
+    return df
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and,
+    # from each bucket in between, the point that forms the largest triangle
+    # with the previously kept point and the average of the next bucket
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    indices = np.empty(n_out, dtype='int64')
+    indices[0] = 0
+    indices[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i == n_out - 3:
+            next_x, next_y = x[n - 1], y[n - 1]
+        else:
+            next_x = x[stop:edges[i + 2]].mean()
+            next_y = y[stop:edges[i + 2]].mean()
+        areas = np.abs(
+            (x[prev] - next_x) * (y[start:stop] - y[prev]) -
+            (x[prev] - x[start:stop]) * (next_y - y[prev])
         )
-        dfs_by_window_cleaned = {}
-        for ma_window in ma_windows:
-            dfs_by_window_cleaned[ma_window] = (
-                dfs_by_window[ma_window]
-                .merge(df_btc_price, on='timestamp', how='left')
-                .rename(columns={'priceUsd': 'BTC price'})
+        prev = start + int(np.argmax(areas))
+        indices[i + 1] = prev
+    return indices
+
+
+def downsample_price_series(series, max_points):
+    x_values = series.index.values.astype('datetime64[ms]').astype('float64')
+    y_values = series.values.astype('float64')
+    indices = lttb_indices(x_values, y_values, max_points)
+    return series.iloc[indices]
+
+
+def load_indicator_prices(currency='bitcoin', hours=1300):
+    # Enough hourly history for the longest indicator window to warm up
+    # before the last 700 points that are displayed
+    end = dt.datetime.now()
+    df = load_asset_history(
+        start=end - dt.timedelta(hours=hours),
+        end=end,
+        currency=currency,
+        interval='h1'
+    )
+    return df
+
+
+def clean_rsi_data(df_price, window=14, limit=700):
+    df_rsi = (
+        df_price
+        .assign(value=lambda x: indicators.rsi(x['priceUsd'], window))
+        .dropna(subset=['value'])
+        .loc[:, ['timestamp', 'value']]
+        .astype({'value': PRICE_DTYPE})
+        .sort_values(by=['timestamp'], ascending=False)
+        .head(limit)
+        .reset_index(drop=True)
+    )
+    return df_rsi
+
+
+def clean_ma_data(df_price, ma_windows, limit=700, price_label='BTC price'):
+    dfs_by_window = []
+    for ma_window in ma_windows:
+        dfs_by_window.append(
+            df_price
+            .assign(
+                SMA=lambda x: indicators.sma(x['priceUsd'], ma_window),
+                EMA=lambda x: indicators.ema(x['priceUsd'], ma_window),
             )
-        return tuple(dfs_by_window_cleaned.values())
+            .dropna(subset=['SMA', 'EMA'])
+            .rename(columns={'priceUsd': price_label})
+            .loc[:, ['timestamp', 'SMA', 'EMA', price_label]]
+            .astype({'SMA': PRICE_DTYPE, 'EMA': PRICE_DTYPE, price_label: PRICE_DTYPE})
+            .sort_values(by=['timestamp'])
+            .tail(limit)
+            .reset_index(drop=True)
+        )
+    return tuple(dfs_by_window)
 
 
 def clean_exchange_rates(date, currency_names):
@@ -74,6 +220,180 @@ def clean_exchange_rates(date, currency_names):
     return rates
 
 
+def clean_exchange_rate_history(start, end, currency_names):
+    # Only dates before the first or after the last stored reference rate
+    # are requested, gaps of a few days are expected around weekends and
+    # holidays; the spot rates of `clean_exchange_rates` are not counted
+    df_stored = models.get_exchange_rate_history(start, end)
+    missing_ranges = []
+    if df_stored.empty:
+        missing_ranges.append((start, end))
+    else:
+        first_date = dt.date.fromisoformat(df_stored['date'].min())
+        last_date = dt.date.fromisoformat(df_stored['date'].max())
+        if first_date - start > dt.timedelta(days=7):
+            missing_ranges.append((start, first_date - dt.timedelta(days=1)))
+        if last_date < end:
+            missing_ranges.append((last_date + dt.timedelta(days=1), end))
+    for range_start, range_end in missing_ranges:
+        records = (
+            api
+            .get_exchange_rate_history(range_start, range_end, currency_names)
+            .loc[lambda x: x['date'].between(str(range_start), str(range_end))]
+            .loc[:, ['date', *currency_names]]
+            .to_dict('records')
+        )
+        models.save_exchange_rate_history(records)
+    if missing_ranges:
+        df_stored = models.get_exchange_rate_history(start, end)
+    df_rates = (
+        df_stored
+        .assign(date=lambda x: pd.to_datetime(x['date']))
+        .set_index('date')
+        .loc[:, currency_names]
+        .sort_index()
+    )
+    return df_rates
+
+
+def convert_price_data(df, df_rates, currency):
+    # As-of join: every price is converted with the latest rate published on
+    # or before its date, prices older than the first rate use that rate
+    rate_dates = df_rates.index.values.astype('datetime64[ms]')
+    price_dates = df.index.values.astype('datetime64[ms]')
+    rows = np.searchsorted(rate_dates, price_dates, side='right') - 1
+    rates = df_rates[currency].to_numpy()[np.clip(rows, 0, None)]
+    prices = df.to_numpy()
+    df_converted = pd.DataFrame(
+        prices * rates.astype(prices.dtype)[:, np.newaxis],
+        index=df.index,
+        columns=df.columns
+    )
+    return df_converted
+
+
+def clean_ranking_data(df):
+    # Prices stay in USD, the conversion to the base currency and the
+    # matching column names are applied in the browser
+    df_cleaned = (
+        df
+        .sort_values(by=['rank'])
+        .assign(
+            Logo=lambda x: (
+                '[![Coin](https://cryptologos.cc/logos/' +
+                x["id"] + "-" + x["symbol"].str.lower() +
+                '-logo.svg?v=023#thumbnail)](https://cryptologos.cc/)'
+            ),
+        )
+        .round({
+            'supply': 2,
+            'changePercent24Hr': 2,
+        })
+        .rename(columns={
+            'rank': 'Pos',
+            'name': 'Crypto Name',
+            'symbol': 'Symbol',
+            'supply': 'Supply',
+            'changePercent24Hr': "Change24h[%]",
+        })
+        .set_index('id')
+        .reindex(columns=[
+            'Pos', 'Logo', 'Crypto Name', 'Symbol',
+            'priceUsd', 'Supply', 'marketCapUsd', 'Change24h[%]'
+        ])
+    )
+    return df_cleaned
+
+
+def apply_live_quotes(df, quotes):
+    # Latest streamed prices override the REST snapshot, the market cap
+    # follows the price at the snapshot supply
+    live_prices = pd.Series(df.index.map(quotes), index=df.index, dtype='float64')
+    return df.assign(
+        priceUsd=live_prices.fillna(df['priceUsd']),
+        marketCapUsd=(live_prices * df['Supply']).fillna(df['marketCapUsd'])
+    )
+
+
+def get_ranking_column(column_id, rates):
+    # Table columns of converted values are named after the base currency
+    # symbol, e.g. 'Price[€]'; they map to the USD column and the rate and
+    # rounding used to display them
+    for prefix, (column, digits) in RANKING_CURRENCY_COLUMNS.items():
+        if column_id.startswith(prefix + '['):
+            currency = SYMBOL_CURRENCIES.get(column_id[len(prefix) + 1:-1], 'USD')
+            return column, (rates or {}).get(currency, 1.0), digits
+    return column_id, None, None
+
+
+def parse_filter_value(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+        return value[1:-1]
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def filter_ranking_data(df, filter_query, rates):
+    # Supports the expressions the DataTable filter row produces, joined by
+    # '&&'; parts on unknown columns or operators are ignored
+    for filter_part in (filter_query or '').split(' && '):
+        match = FILTER_PATTERN.fullmatch(filter_part.strip())
+        if match is None:
+            continue
+        column, rate, digits = get_ranking_column(match['column'], rates)
+        operator = match['operator']
+        is_case_sensitive = True
+        if operator not in FILTER_OPERATORS and operator[:1] in ('s', 'i'):
+            is_case_sensitive = operator[0] == 's'
+            operator = operator[1:]
+        if column not in df.columns or operator not in FILTER_OPERATORS:
+            continue
+        series = df[column]
+        if rate is not None:
+            series = (series * rate).round(digits)
+        value = parse_filter_value(match['value'])
+        if operator in ('contains', 'datestartswith'):
+            text = series.astype(str)
+            if not is_case_sensitive:
+                text, value = text.str.lower(), str(value).lower()
+            if operator == 'contains':
+                mask = text.str.contains(str(value), regex=False)
+            else:
+                mask = text.str.startswith(str(value))
+        elif isinstance(value, float) and pd.api.types.is_numeric_dtype(series):
+            mask = FILTER_OPERATORS[operator](series, value)
+        else:
+            mask = FILTER_OPERATORS[operator](series.astype(str), str(value))
+        df = df.loc[mask]
+    return df
+
+
+def sort_ranking_data(df, sort_by, rates):
+    # Converted columns are sorted by their USD values, the order is the same
+    columns = []
+    ascending = []
+    for sort in sort_by or []:
+        column = get_ranking_column(sort['column_id'], rates)[0]
+        if column in df.columns:
+            columns.append(column)
+            ascending.append(sort['direction'] == 'asc')
+    if not columns:
+        return df
+    return df.sort_values(by=columns, ascending=ascending, kind='stable')
+
+
+def query_ranking_data(df, filter_query, sort_by, page_current, page_size, rates):
+    df_filtered = sort_ranking_data(
+        filter_ranking_data(df, filter_query, rates), sort_by, rates
+    )
+    first_row = page_current * page_size
+    df_page = df_filtered.iloc[first_row:first_row + page_size]
+    return df_page, len(df_filtered)
+
+
 def resample_df_fng(df):
     today = df['timestamp'].max()
     selected_dates = [